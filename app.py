@@ -5,15 +5,26 @@ PB Fortune - Stock Trading Plan Manager
 
 from flask import Flask, jsonify, render_template, request
 from flask_cors import CORS
+from functools import wraps
+from datetime import datetime, timedelta
 import yaml
 import re
 import sys
 import os
+import hmac
+import time
 import logging
+import threading
 from database import TradingPlanDB
 
 logger = logging.getLogger(__name__)
 
+# 预编译交易计划解析正则，避免保存热路径上的重复编译/缓存查找
+# Pattern 1: 股票名称：SYMBOL (Name)
+_PAT_SYM_FIRST = re.compile(r'股票名称[：:]\s*([A-Z]+)\s*\(([^)]+)\)')
+# Pattern 2: 股票名称：Name (SYMBOL)
+_PAT_NAME_FIRST = re.compile(r'股票名称[：:]\s*([^(]+?)\s*\(([A-Z]+)\)')
+
 # Add mock_trade directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'mock_trade'))
 from monitor import get_monitor
@@ -21,22 +32,108 @@ from monitor import get_monitor
 app = Flask(__name__)
 CORS(app)
 
-# Load configuration
+# orjson 序列化大列表响应（/api/plans 等）比 stdlib json 快数倍；未安装时回退默认
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+
+    class OrjsonProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
+except ImportError:
+    pass
+
+# Load configuration (libyaml C 解析器比纯 Python 快约 10 倍，缺失时回退)
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 with open('config.yaml', 'r', encoding='utf-8') as f:
-    config = yaml.safe_load(f)
+    config = yaml.load(f, Loader=_YAML_LOADER)
+
+# 高频读取的配置冻结为模块级常量，省去每次请求的 dict 链式查找
+_SAVE_PW = config.get('app', {}).get('save_password', '').encode()
+_DIFY_URL = config.get('dify', {}).get('chatbot_url', '')
+_HOST = config.get('app', {}).get('host', '0.0.0.0')
+_PORT = config.get('app', {}).get('port', 8888)
+_DEBUG = config.get('app', {}).get('debug', False)
+
+
+def verify_password(password):
+    """常数时间密码比对"""
+    # JSON 里可能带非字符串(如数字),统一转 str 再比,错误类型只会比对失败
+    return hmac.compare_digest(_SAVE_PW, str(password or '').encode())
+
+
+def require_password(f):
+    """请求体携带 password 的受保护端点装饰器"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        if not verify_password(data.get('password', '')):
+            return jsonify({
+                'status': 'error',
+                'message': '密码错误，无权操作'
+            }), 403
+        return f(*args, **kwargs)
+    return wrapper
+
+
+# 轻量 TTL 响应缓存：把前端轮询在窗口内的重复请求合并为一次 monitor 调用
+_response_cache = {}
+
+# 正常流量下"端点×参数组合"远小于此;超限说明有客户端在乱构造查询参数
+_RESPONSE_CACHE_MAX = 64
+
+
+def ttl_cache(seconds, query_args=()):
+    """按端点（可选带查询参数）缓存响应 seconds 秒"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = (f.__name__,) + tuple(
+                request.args.get(a, '') for a in query_args
+            )
+            hit = _response_cache.get(key)
+            now = time.monotonic()
+            if hit and now < hit[0]:
+                return hit[1]
+            response = f(*args, **kwargs)
+            # 查询参数来自未认证请求,键空间可被任意撑大:
+            # 写入前先清过期项,仍超限则整体清空,缓存大小从此有界
+            if len(_response_cache) >= _RESPONSE_CACHE_MAX:
+                for k in [k for k, (exp, _) in _response_cache.items()
+                          if exp <= now]:
+                    _response_cache.pop(k, None)
+                if len(_response_cache) >= _RESPONSE_CACHE_MAX:
+                    _response_cache.clear()
+            _response_cache[key] = (now + seconds, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_response_cache():
+    """监控状态变更后清空缓存，下一次轮询拿到新鲜数据"""
+    _response_cache.clear()
 
 # Initialize database
 db = TradingPlanDB()
 
-# Initialize mock trading monitor (singleton)
-monitor = get_monitor()
+# Initialize mock trading monitor (singleton),计划库复用上面的 db 实例
+monitor = get_monitor(plan_db=db)
 
 # Auto-start monitoring on startup
 def init_monitoring():
     """初始化并自动启动监控"""
-    # Flask debug 模式下，只在 reloader 进程中启动监控
-    # os.environ.get('WERKZEUG_RUN_MAIN') 为 'true' 表示 reloader 进程
-    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    # debug 模式下 Werkzeug reloader 会把 app.py 导入两遍(父进程+子进程),
+    # 只在 reloader 子进程(WERKZEUG_RUN_MAIN='true')里启动监控,
+    # 否则会出现两个调度器、重复成交和日志
+    # (必须看配置值 _DEBUG:此线程在 import 期启动,app.debug 要到
+    #  app.run() 才被置位,永远是 False)
+    if not _DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         print("\n" + "="*60)
         print("  🚀 自动启动模拟交易监控")
         print("="*60)
@@ -53,25 +150,24 @@ def init_monitoring():
             print("⚠️  数据库中暂无交易计划,监控未启动")
             print("="*60 + "\n")
 
-# Initialize monitoring when app starts
-init_monitoring()
+# Initialize monitoring in the background so Flask can accept traffic immediately
+threading.Thread(target=init_monitoring, daemon=True, name='init-monitoring').start()
 
 
 @app.route('/')
 def index():
     """Home page"""
-    dify_url = config.get('dify', {}).get('chatbot_url', '')
-    return render_template('trading_plans.html', dify_url=dify_url)
+    return render_template('trading_plans.html', dify_url=_DIFY_URL)
 
 
 def parse_trading_plan(content):
     """Parse trading plan content and extract stock info"""
     # Try pattern 1: 股票名称：SYMBOL (Name)
-    stock_match = re.search(r'股票名称[：:]\s*([A-Z]+)\s*\(([^)]+)\)', content)
-    
+    stock_match = _PAT_SYM_FIRST.search(content)
+
     # Try pattern 2: 股票名称：Name (SYMBOL)
     if not stock_match:
-        stock_match = re.search(r'股票名称[：:]\s*([^(]+?)\s*\(([A-Z]+)\)', content)
+        stock_match = _PAT_NAME_FIRST.search(content)
         if stock_match:
             # Swap: group1 is name, group2 is symbol
             stock_name = stock_match.group(1).strip()
@@ -97,8 +193,7 @@ def handle_plans():
         conversation_id = data.get('conversation_id')
         
         # 验证密码（后端验证，无法绕过）
-        correct_password = config.get('app', {}).get('save_password', '')
-        if password != correct_password:
+        if not verify_password(password):
             return jsonify({
                 'status': 'error',
                 'message': '密码错误，无权保存'
@@ -137,6 +232,44 @@ def handle_plans():
         })
 
 
+@app.route('/api/plans/bulk', methods=['POST'])
+def save_plans_bulk():
+    """批量保存交易计划（迁移/导入用）"""
+    data = request.get_json()
+    password = data.get('password', '')
+    contents = data.get('plans', [])
+
+    # 验证密码（后端验证，无法绕过）
+    if not verify_password(password):
+        return jsonify({
+            'status': 'error',
+            'message': '密码错误，无权保存'
+        }), 403
+
+    plans = []
+    skipped = []
+    for item in contents:
+        content = item.get('content', '')
+        stock_symbol, stock_name, plan_content = parse_trading_plan(content)
+        if not stock_symbol:
+            skipped.append(content[:50])
+            continue
+        plans.append({
+            'stock_symbol': stock_symbol,
+            'stock_name': stock_name,
+            'plan_content': plan_content,
+            'conversation_id': item.get('conversation_id')
+        })
+
+    saved = db.save_plans_bulk(plans)
+
+    return jsonify({
+        'status': 'success',
+        'saved': saved,
+        'skipped': len(skipped)
+    })
+
+
 @app.route('/api/plans/<int:plan_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_plan(plan_id):
     """Handle single trading plan"""
@@ -182,19 +315,9 @@ def get_stock_versions(stock_symbol):
 
 
 @app.route('/api/plans/<int:plan_id>/star', methods=['POST'])
+@require_password
 def toggle_star(plan_id):
     """Toggle star status (requires authentication)"""
-    data = request.get_json()
-    password = data.get('password', '')
-    
-    # 验证密码
-    correct_password = config.get('app', {}).get('save_password', '')
-    if password != correct_password:
-        return jsonify({
-            'status': 'error',
-            'message': '密码错误，无权操作'
-        }), 403
-    
     new_status = db.toggle_star(plan_id)
     return jsonify({
         'status': 'success',
@@ -220,8 +343,7 @@ def unlock_chat():
     password = data.get('password', '')
     
     # 验证密码
-    correct_password = config.get('app', {}).get('save_password', '')
-    if password != correct_password:
+    if not verify_password(password):
         return jsonify({
             'status': 'error',
             'message': '密码错误'
@@ -238,6 +360,7 @@ def unlock_chat():
 # ============================================================
 
 @app.route('/api/mock-trading/status')
+@ttl_cache(5)
 def get_trading_status():
     """获取交易监控状态"""
     return jsonify({
@@ -248,6 +371,7 @@ def get_trading_status():
 
 
 @app.route('/api/mock-trading/account')
+@ttl_cache(5)
 def get_account_info():
     """获取账户信息"""
     summary = monitor.get_account_summary()
@@ -294,43 +418,46 @@ def get_monitor_logs():
     })
 
 
+# 日志翻译表：正则一次线性扫描完成所有短语替换（替代逐短语 str.replace）
+_LOG_TRANSLATIONS = {
+    '交易市场已关闭，等待下次监控': 'Market is closed, waiting for next monitor',
+    '当前': 'Current',
+    '持有中': 'Holding',
+    '止损': 'Stop Loss',
+    '止盈': 'Take Profit',
+    '价格高于买入价': 'Price above entry',
+    '未买入': 'Not bought',
+    '未满足买入条件': 'Entry condition not met',
+    '买入价': 'Entry',
+    '买入失败': 'Buy failed',
+    '买入': 'Buy',
+    '卖出失败': 'Sell failed',
+    '卖出': 'Sell',
+    '盈亏': 'P&L',
+    '股': 'shares',
+    '无法获取股价': 'Failed to get price',
+    '没有交易计划': 'No trading plan',
+    '资金不足无法买入': 'Insufficient funds'
+}
+
+# 长短语在前，保证"买入价"优先于"买入"命中
+_LOG_TRANS_RE = re.compile('|'.join(
+    map(re.escape, sorted(_LOG_TRANSLATIONS, key=len, reverse=True))
+))
+
+
 def translate_logs_to_english(logs):
     """将中文日志翻译为英文"""
-    translations = {
-        '交易市场已关闭，等待下次监控': 'Market is closed, waiting for next monitor',
-        '当前': 'Current',
-        '持有中': 'Holding',
-        '止损': 'Stop Loss',
-        '止盈': 'Take Profit',
-        '价格高于买入价': 'Price above entry',
-        '未买入': 'Not bought',
-        '未满足买入条件': 'Entry condition not met',
-        '买入价': 'Entry',
-        '买入': 'Buy',
-        '卖出': 'Sell',
-        '盈亏': 'P&L',
-        '股': 'shares',
-        '无法获取股价': 'Failed to get price',
-        '没有交易计划': 'No trading plan',
-        '资金不足无法买入': 'Insufficient funds',
-        '买入失败': 'Buy failed',
-        '卖出失败': 'Sell failed'
-    }
-    
-    translated_logs = []
-    for log in logs:
-        message = log['message']
-        # 替换中文为英文
-        for zh, en in translations.items():
-            message = message.replace(zh, en)
-        
-        translated_logs.append({
+    sub = _LOG_TRANS_RE.sub
+    lookup = _LOG_TRANSLATIONS
+    return [
+        {
             'timestamp': log['timestamp'],
-            'message': message,
+            'message': sub(lambda m: lookup[m.group(0)], log['message']),
             'type': log['type']
-        })
-    
-    return translated_logs
+        }
+        for log in logs
+    ]
 
 
 @app.route('/api/mock-trading/trigger-monitor', methods=['POST'])
@@ -338,6 +465,7 @@ def trigger_monitor():
     """手动触发一次监控任务（用于测试）"""
     try:
         monitor.monitor_task()
+        invalidate_response_cache()
         return jsonify({
             'status': 'success',
             'message': '监控任务已执行'
@@ -350,19 +478,9 @@ def trigger_monitor():
 
 
 @app.route('/api/mock-trading/start', methods=['POST'])
+@require_password
 def start_trading():
     """启动交易监控"""
-    data = request.get_json() or {}
-    password = data.get('password', '')
-    
-    # 验证密码
-    correct_password = config.get('app', {}).get('save_password', '')
-    if password != correct_password:
-        return jsonify({
-            'status': 'error',
-            'message': '密码错误，无权操作'
-        }), 403
-    
     if monitor.is_running:
         return jsonify({
             'status': 'error',
@@ -380,6 +498,7 @@ def start_trading():
     
     # 启动监控
     monitor.start()
+    invalidate_response_cache()
     
     return jsonify({
         'status': 'success',
@@ -389,19 +508,9 @@ def start_trading():
 
 
 @app.route('/api/mock-trading/stop', methods=['POST'])
+@require_password
 def stop_trading():
     """停止交易监控"""
-    data = request.get_json() or {}
-    password = data.get('password', '')
-    
-    # 验证密码
-    correct_password = config.get('app', {}).get('save_password', '')
-    if password != correct_password:
-        return jsonify({
-            'status': 'error',
-            'message': '密码错误，无权操作'
-        }), 403
-    
     if not monitor.is_running:
         return jsonify({
             'status': 'error',
@@ -409,6 +518,7 @@ def stop_trading():
         }), 400
     
     monitor.stop()
+    invalidate_response_cache()
     
     # 返回最终状态
     summary = monitor.get_account_summary()
@@ -421,21 +531,13 @@ def stop_trading():
 
 
 @app.route('/api/mock-trading/reload', methods=['POST'])
+@require_password
 def reload_strategies():
     """重新加载交易策略"""
-    data = request.get_json() or {}
-    password = data.get('password', '')
-    
-    # 验证密码
-    correct_password = config.get('app', {}).get('save_password', '')
-    if password != correct_password:
-        return jsonify({
-            'status': 'error',
-            'message': '密码错误，无权操作'
-        }), 403
-    
-    # 重新加载策略
+    # 显式 reload 必须拿到最新计划,绕过加载器的指纹缓存
+    monitor.db_loader.invalidate_cache()
     count = monitor.load_strategies_from_db()
+    invalidate_response_cache()
     
     return jsonify({
         'status': 'success',
@@ -445,6 +547,7 @@ def reload_strategies():
 
 
 @app.route('/api/mock-trading/stats')
+@ttl_cache(5)
 def get_trading_stats():
     """获取交易统计"""
     stats = monitor.get_trading_stats()
@@ -455,6 +558,7 @@ def get_trading_stats():
 
 
 @app.route('/api/mock-trading/equity-curve')
+@ttl_cache(15, query_args=('range',))
 def get_equity_curve():
     """获取权益曲线数据"""
     try:
@@ -468,23 +572,21 @@ def get_equity_curve():
             # 默认显示最近30条
             snapshots = monitor.trade_db.get_account_snapshots(limit=30)
         
-        # 如果没有快照，生成默认数据
+        # 如果没有快照，生成默认数据（now 只取一次，默认行与当前行复用）
+        now = datetime.now()
         if not snapshots:
-            from datetime import datetime, timedelta
-            now = datetime.now()
             snapshots = [
                 {
-                    'timestamp': (now - timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'),
+                    'timestamp': (now - timedelta(days=i)).isoformat(sep=' ', timespec='seconds'),
                     'total_equity': 100000.0
                 }
                 for i in range(6, -1, -1)  # 生成过去7天的数据
             ]
         
         # 添加当前权益
-        from datetime import datetime
         current_summary = monitor.get_account_summary()
         snapshots.append({
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'timestamp': now.isoformat(sep=' ', timespec='seconds'),
             'total_equity': current_summary['total_equity']
         })
         
@@ -504,7 +606,7 @@ def get_equity_curve():
 
 if __name__ == '__main__':
     app.run(
-        host=config.get('app', {}).get('host', '0.0.0.0'),
-        port=config.get('app', {}).get('port', 8888),
-        debug=config.get('app', {}).get('debug', False)
+        host=_HOST,
+        port=_PORT,
+        debug=_DEBUG
     )
@@ -4,10 +4,140 @@ Database operations for trading plans
 """
 
 import sqlite3
+import atexit
 import json
+import logging
+import queue
 from datetime import datetime
 from contextlib import contextmanager
 
+logger = logging.getLogger(__name__)
+
+# 连接池大小（SQLite 写者天然串行，少量连接即可喂饱读路径）
+POOL_SIZE = 4
+
+# 热路径 SQL 常量：文本不变才能命中 sqlite3 的语句缓存
+# 版本号与星标继承通过标量子查询在同一条 INSERT 内完成，省一次往返并消除读写竞态
+_SQL_INSERT_PLAN = '''
+    INSERT INTO trading_plans
+    (stock_symbol, stock_name, plan_content, spot_plan, option_plan, conversation_id, version, tracking_status, is_starred)
+    VALUES (?, ?, ?, ?, ?, ?,
+        COALESCE((SELECT MAX(version) FROM trading_plans WHERE stock_symbol = ?), 0) + 1,
+        ?,
+        COALESCE((SELECT is_starred FROM trading_plans
+                  WHERE stock_symbol = ? ORDER BY version DESC LIMIT 1), 0)
+    )
+'''
+
+# 列表查询只取 UI 实际渲染的列（spot_plan/option_plan/conversation_id 不下发）
+_LIST_COLUMNS = ('id, stock_symbol, stock_name, plan_content, created_at, '
+                 'status, version, is_starred, tracking_status')
+
+_SQL_ALL_PLANS = f'''
+    SELECT {_LIST_COLUMNS} FROM trading_plans
+    WHERE status = ?
+    ORDER BY created_at DESC
+'''
+
+_SQL_PLAN_BY_ID = 'SELECT * FROM trading_plans WHERE id = ?'
+
+_SQL_DELETE_PLAN = 'DELETE FROM trading_plans WHERE id = ?'
+
+_SQL_PLAN_VERSIONS = f'''
+    SELECT {_LIST_COLUMNS} FROM trading_plans
+    WHERE stock_symbol = ?
+    ORDER BY version DESC
+'''
+
+# 窗口函数单次扫描取每只股票的最新版本（替代自连接的两次扫描）
+_SQL_LATEST_PLANS = f'''
+    SELECT {_LIST_COLUMNS}
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY stock_symbol ORDER BY version DESC
+        ) AS rn
+        FROM trading_plans
+        WHERE status = ?
+    )
+    WHERE rn = 1
+    ORDER BY
+        CASE tracking_status
+            WHEN 'active' THEN 1
+            WHEN 'paused' THEN 2
+            ELSE 3
+        END,
+        is_starred DESC,
+        created_at DESC
+'''
+
+# 活跃计划的变更指纹:行数/最大 id 捕捉增删,星标加权和捕捉 toggle_star,
+# 内容长度和捕捉大部分 update_plan 的原地编辑
+# (等长改写由 get_plans_fingerprint 里的进程内写计数兜底)
+_SQL_PLANS_FINGERPRINT = '''
+    SELECT COUNT(*),
+           COALESCE(MAX(id), 0),
+           COALESCE(MAX(created_at), ''),
+           COALESCE(SUM(is_starred * id), 0),
+           COALESCE(SUM(length(plan_content)), 0)
+    FROM trading_plans
+    WHERE status = 'active'
+'''
+
+_SQL_GET_STARRED = 'SELECT is_starred FROM trading_plans WHERE id = ?'
+
+_SQL_SET_STARRED = 'UPDATE trading_plans SET is_starred = ? WHERE id = ?'
+
+_SQL_SEARCH_PLANS = f'''
+    SELECT {_LIST_COLUMNS} FROM trading_plans
+    WHERE stock_symbol LIKE ? OR stock_name LIKE ?
+    ORDER BY created_at DESC
+'''
+
+# FTS5 倒排索引搜索（替代前置通配符 LIKE 的全表扫描）
+_SQL_SEARCH_PLANS_FTS = f'''
+    SELECT {', '.join('t.' + c for c in _LIST_COLUMNS.split(', '))}
+    FROM trading_plans_fts f
+    JOIN trading_plans t ON t.id = f.rowid
+    WHERE trading_plans_fts MATCH ?
+    ORDER BY rank
+'''
+
+_FTS_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS trading_plans_fts USING fts5(
+        stock_symbol, stock_name, plan_content,
+        content='trading_plans', content_rowid='id',
+        tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS trading_plans_ai AFTER INSERT ON trading_plans BEGIN
+        INSERT INTO trading_plans_fts(rowid, stock_symbol, stock_name, plan_content)
+        VALUES (new.id, new.stock_symbol, new.stock_name, new.plan_content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trading_plans_ad AFTER DELETE ON trading_plans BEGIN
+        INSERT INTO trading_plans_fts(trading_plans_fts, rowid, stock_symbol, stock_name, plan_content)
+        VALUES ('delete', old.id, old.stock_symbol, old.stock_name, old.plan_content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trading_plans_au AFTER UPDATE ON trading_plans BEGIN
+        INSERT INTO trading_plans_fts(trading_plans_fts, rowid, stock_symbol, stock_name, plan_content)
+        VALUES ('delete', old.id, old.stock_symbol, old.stock_name, old.plan_content);
+        INSERT INTO trading_plans_fts(rowid, stock_symbol, stock_name, plan_content)
+        VALUES (new.id, new.stock_symbol, new.stock_name, new.plan_content);
+    END;
+'''
+
+
+def _rows_to_dicts(cursor):
+    """列名只从 cursor.description 取一次，逐行 zip 成 dict"""
+    cols = [d[0] for d in cursor.description]
+    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+
+def _row_to_dict(cursor, row):
+    """单行版本：row 为 None 时返回 None"""
+    if row is None:
+        return None
+    cols = [d[0] for d in cursor.description]
+    return dict(zip(cols, row))
+
 
 class TradingPlanDB:
     def __init__(self, db_path='data/trading_plans.db'):
@@ -15,13 +145,54 @@ class TradingPlanDB:
         # 确保数据目录存在
         import os
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 常驻连接池：避免每个请求 open/close 连接的开销
+        self._pool = queue.Queue(maxsize=POOL_SIZE)
+        self._fresh_db = not os.path.exists(db_path) or os.path.getsize(db_path) == 0
+        # 原地编辑计数:update_plan 改 plan_content 不动行数/最大 id,
+        # 把它并进指纹才能让策略缓存感知到内容变更
+        self._content_version = 0
+        if self._fresh_db:
+            self._init_auto_vacuum()
         self.init_db()
+        atexit.register(self.close)
+
+    def _init_auto_vacuum(self):
+        """全新库:启用增量空闲页回收,避免文件只增不减
+
+        auto_vacuum 必须在库文件初始化(进 WAL)之前写进库头,而连接池里的
+        连接一律先跑 _tune_connection 设 WAL,所以用一条未调优的裸连接
+        先 VACUUM 落盘
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
     
+    def _tune_connection(self, conn):
+        """应用性能 PRAGMA (WAL 读写不互斥, NORMAL 减少 fsync)"""
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=268435456')
+
+    def _create_connection(self):
+        """创建并调优一个新连接"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=256)
+        self._tune_connection(conn)
+        return conn
+
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for pooled database connections"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._create_connection()
         try:
             yield conn
             conn.commit()
@@ -29,11 +200,17 @@ class TradingPlanDB:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
     
     def init_db(self):
         """Initialize database schema"""
         with self.get_connection() as conn:
+            # 建表/迁移/建索引在同一事务内原子完成,一次 fsync
+            # (后面的 FTS executescript 会先提交此事务,边界正好在索引之后)
+            conn.execute('BEGIN IMMEDIATE')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS trading_plans (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,6 +228,22 @@ class TradingPlanDB:
                 )
             ''')
             
+            # 迁移：为旧数据添加 tracking_status 字段
+            # user_version 作为 schema 版本号，已迁移的库直接跳过列探测
+            if conn.execute('PRAGMA user_version').fetchone()[0] < 1:
+                columns = {
+                    row[1] for row in conn.execute('PRAGMA table_info(trading_plans)')
+                }
+                if 'tracking_status' not in columns:
+                    conn.execute('ALTER TABLE trading_plans ADD COLUMN tracking_status TEXT DEFAULT "active"')
+                    # 自动判断所有已有计划的状态
+                    conn.execute('''
+                        UPDATE trading_plans
+                        SET tracking_status = 'active'
+                        WHERE tracking_status IS NULL
+                    ''')
+                conn.execute('PRAGMA user_version = 1')
+
             # Create index for faster queries
             conn.execute('''
                 CREATE INDEX IF NOT EXISTS idx_stock_symbol 
@@ -61,23 +254,112 @@ class TradingPlanDB:
                 ON trading_plans(is_starred DESC, created_at DESC)
             ''')
             conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_tracking_status 
+                CREATE INDEX IF NOT EXISTS idx_tracking_status
                 ON trading_plans(tracking_status, created_at DESC)
             ''')
+            # save_plan 的 MAX(version)/is_starred 子查询走此索引单次定位
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_symbol_version
+                ON trading_plans(stock_symbol, version DESC)
+            ''')
+            # get_latest_plans 的窗口函数按此索引消费有序输入，免临时排序
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_status_symbol_version
+                ON trading_plans(status, stock_symbol, version DESC)
+            ''')
             
-            # 迁移：为旧数据添加 tracking_status 字段
+            # get_all_plans 按此索引有序输出，免去过滤后的临时排序
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_status_created
+                ON trading_plans(status, created_at DESC)
+            ''')
+            # search_plans 的 LIKE 回退在 stock_name 精确/前缀匹配时可用
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stock_name
+                ON trading_plans(stock_name)
+            ''')
+
+            # 全文搜索索引（环境不支持 FTS5 时回退到 LIKE）
             try:
-                conn.execute('SELECT tracking_status FROM trading_plans LIMIT 1')
-            except:
-                conn.execute('ALTER TABLE trading_plans ADD COLUMN tracking_status TEXT DEFAULT "active"')
-                # 自动判断所有已有计划的状态
-                conn.execute('''
-                    UPDATE trading_plans 
-                    SET tracking_status = 'active'
-                    WHERE tracking_status IS NULL
-                ''')
-                conn.commit()
-    
+                conn.executescript(_FTS_SCHEMA)
+                # 外部内容表的 count(*) 读的是内容表而非倒排索引,探测不出
+                # 索引是否空;用 user_version=2 标记"已整体重建过一次",
+                # 老库(含此前漏灌存量数据的)在此一次性补齐
+                if conn.execute('PRAGMA user_version').fetchone()[0] < 2:
+                    conn.execute('''
+                        INSERT INTO trading_plans_fts(trading_plans_fts)
+                        VALUES ('rebuild')
+                    ''')
+                    conn.execute('PRAGMA user_version = 2')
+                self._fts_enabled = True
+            except sqlite3.OperationalError:
+                self._fts_enabled = False
+
+            self._check_query_plans(conn)
+
+    def _check_query_plans(self, conn):
+        """启动期用 EXPLAIN QUERY PLAN 巡检热路径 SQL，发现全表扫描即告警
+
+        索引被误删或查询改写退化成 SCAN 时能在日志里第一时间暴露，
+        而不是等数据量上来后才在线上变慢。
+        前置通配符 LIKE（search_plans 回退路径）天然无法走 B-Tree，不在巡检范围。
+        """
+        # 小表全扫是代价模型的正确选择，告警只在数据量足以放大差距时才有意义
+        total = conn.execute('SELECT COUNT(*) FROM trading_plans').fetchone()[0]
+        if total < 512:
+            return
+        canonical = (
+            (_SQL_ALL_PLANS, ('active',)),
+            (_SQL_PLAN_VERSIONS, ('AAPL',)),
+            (_SQL_LATEST_PLANS, ('active',)),
+        )
+        for sql, params in canonical:
+            try:
+                rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            except sqlite3.Error:
+                continue
+            for row in rows:
+                # 只关心主表全扫；'SCAN (subquery-N)' 是窗口函数协程的正常形态
+                if 'SCAN trading_plans' in row[-1]:
+                    logger.warning(
+                        '查询计划退化为全表扫描: %s (SQL: %s...)',
+                        row[-1], ' '.join(sql.split())[:80]
+                    )
+
+    def get_plans_fingerprint(self):
+        """获取活跃计划的变更指纹(供调用方做缓存失效判断)
+
+        任何新增/删除/换版本/星标变化以及原地编辑都会改变指纹;
+        指纹不变时调用方可以跳过重新加载和解析
+
+        Returns:
+            可比较的元组
+        """
+        with self.get_connection() as conn:
+            row = conn.execute(_SQL_PLANS_FINGERPRINT).fetchone()
+        # 进程内写计数兜底等长改写(SQL 侧的 length 和对其不敏感)
+        return tuple(row) + (self._content_version,)
+
+    def optimize(self):
+        """周期性维护：刷新统计信息、回收空闲页（供后台调度调用）"""
+        with self.get_connection() as conn:
+            conn.execute('ANALYZE trading_plans')
+            conn.execute('PRAGMA incremental_vacuum(1000)')
+            conn.execute('PRAGMA optimize')
+
+    def close(self):
+        """关闭连接池；退出前跑一次 PRAGMA optimize 保持查询计划统计新鲜"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.execute('PRAGMA optimize')
+                conn.close()
+            except sqlite3.Error:
+                pass
+
     def save_plan(self, stock_symbol, stock_name, plan_content, 
                   spot_plan=None, option_plan=None, conversation_id=None):
         """Save a new trading plan with version control and auto-detect tracking status"""
@@ -85,34 +367,56 @@ class TradingPlanDB:
         tracking_status = self._detect_tracking_status(plan_content)
         
         with self.get_connection() as conn:
-            # Get the latest version for this stock
-            cursor = conn.execute('''
-                SELECT MAX(version), is_starred FROM trading_plans 
-                WHERE stock_symbol = ?
-                GROUP BY stock_symbol
-            ''', (stock_symbol,))
-            result = cursor.fetchone()
-            next_version = (result[0] or 0) + 1 if result else 1
-            # Inherit is_starred from previous version, default to 0 for new stocks
-            is_starred = result[1] if result and result[1] is not None else 0
-            
-            cursor = conn.execute('''
-                INSERT INTO trading_plans 
-                (stock_symbol, stock_name, plan_content, spot_plan, option_plan, conversation_id, version, tracking_status, is_starred)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            # 版本号自增与 is_starred 继承由 INSERT 内的子查询完成
+            cursor = conn.execute(_SQL_INSERT_PLAN, (
                 stock_symbol,
                 stock_name,
                 plan_content,
                 json.dumps(spot_plan) if spot_plan else None,
                 json.dumps(option_plan) if option_plan else None,
                 conversation_id,
-                next_version,
+                stock_symbol,
                 tracking_status,
-                is_starred
+                stock_symbol
             ))
             return cursor.lastrowid
     
+    def save_plans_bulk(self, plans, chunk=450):
+        """Bulk-save trading plans in one transaction (for migration/seeding)
+
+        Args:
+            plans: [{'stock_symbol', 'stock_name', 'plan_content',
+                     'spot_plan', 'option_plan', 'conversation_id'}]
+            chunk: 每批 executemany 的行数上限
+
+        Returns:
+            保存的计划数量
+        """
+        rows = []
+        for plan in plans:
+            stock_symbol = plan['stock_symbol']
+            tracking_status = self._detect_tracking_status(plan['plan_content'])
+            rows.append((
+                stock_symbol,
+                plan.get('stock_name'),
+                plan['plan_content'],
+                json.dumps(plan['spot_plan']) if plan.get('spot_plan') else None,
+                json.dumps(plan['option_plan']) if plan.get('option_plan') else None,
+                plan.get('conversation_id'),
+                stock_symbol,
+                tracking_status,
+                stock_symbol
+            ))
+
+        if not rows:
+            return 0
+
+        # 单事务批量写入：fsync/BEGIN/COMMIT 开销摊到 N 行上
+        with self.get_connection() as conn:
+            for i in range(0, len(rows), chunk):
+                conn.executemany(_SQL_INSERT_PLAN, rows[i:i + chunk])
+        return len(rows)
+
     def _detect_tracking_status(self, plan_content):
         """自动检测跟踪状态"""
         import re
@@ -135,22 +439,14 @@ class TradingPlanDB:
     def get_all_plans(self, status='active'):
         """Get all trading plans"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM trading_plans 
-                WHERE status = ?
-                ORDER BY created_at DESC
-            ''', (status,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            cursor = conn.execute(_SQL_ALL_PLANS, (status,))
+            return _rows_to_dicts(cursor)
     
     def get_plan_by_id(self, plan_id):
         """Get a specific trading plan"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM trading_plans WHERE id = ?
-            ''', (plan_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+            cursor = conn.execute(_SQL_PLAN_BY_ID, (plan_id,))
+            return _row_to_dict(cursor, cursor.fetchone())
     
     def update_plan(self, plan_id, **kwargs):
         """Update a trading plan"""
@@ -175,69 +471,56 @@ class TradingPlanDB:
         
         with self.get_connection() as conn:
             conn.execute(query, values)
-            return True
+        self._content_version += 1
+        return True
     
     def delete_plan(self, plan_id):
         """Delete a trading plan"""
         with self.get_connection() as conn:
-            conn.execute('DELETE FROM trading_plans WHERE id = ?', (plan_id,))
+            conn.execute(_SQL_DELETE_PLAN, (plan_id,))
             return True
     
     def get_plan_versions(self, stock_symbol):
         """Get all versions of a stock's trading plans"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM trading_plans 
-                WHERE stock_symbol = ?
-                ORDER BY version DESC
-            ''', (stock_symbol,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            cursor = conn.execute(_SQL_PLAN_VERSIONS, (stock_symbol,))
+            return _rows_to_dicts(cursor)
     
     def get_latest_plans(self, status='active'):
         """Get only the latest version of each stock's plan, grouped by tracking status"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT t1.* FROM trading_plans t1
-                INNER JOIN (
-                    SELECT stock_symbol, MAX(version) as max_version
-                    FROM trading_plans
-                    WHERE status = ?
-                    GROUP BY stock_symbol
-                ) t2 ON t1.stock_symbol = t2.stock_symbol 
-                     AND t1.version = t2.max_version
-                ORDER BY 
-                    CASE t1.tracking_status
-                        WHEN 'active' THEN 1
-                        WHEN 'paused' THEN 2
-                        ELSE 3
-                    END,
-                    t1.is_starred DESC, 
-                    t1.created_at DESC
-            ''', (status,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            cursor = conn.execute(_SQL_LATEST_PLANS, (status,))
+            return _rows_to_dicts(cursor)
     
     def toggle_star(self, plan_id):
         """Toggle star status of a plan"""
         with self.get_connection() as conn:
             # Get current star status
-            cursor = conn.execute('SELECT is_starred FROM trading_plans WHERE id = ?', (plan_id,))
+            cursor = conn.execute(_SQL_GET_STARRED, (plan_id,))
             row = cursor.fetchone()
             if not row:
                 return False
             
             new_status = 0 if row[0] else 1
-            conn.execute('UPDATE trading_plans SET is_starred = ? WHERE id = ?', (new_status, plan_id))
+            conn.execute(_SQL_SET_STARRED, (new_status, plan_id))
             return new_status
     
     def search_plans(self, keyword):
-        """Search trading plans by stock symbol or name"""
+        """Search trading plans by stock symbol, name or content (FTS5)"""
+        if self._fts_enabled and keyword.strip():
+            # 前缀匹配：引号包裹关键词防止被解析成 FTS 查询语法
+            query = '"{}"*'.format(keyword.strip().replace('"', '""'))
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.execute(_SQL_SEARCH_PLANS_FTS, (query,))
+                    rows = _rows_to_dicts(cursor)
+                if rows:
+                    return rows
+                # unicode61 把连续中文当单个词元,词中缀(如搜"斯拉"找特斯拉)
+                # 在 FTS 里查不到;零命中时继续走 LIKE 保住子串搜索
+            except sqlite3.OperationalError:
+                pass  # 查询语法问题时回退到 LIKE
+
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM trading_plans 
-                WHERE stock_symbol LIKE ? OR stock_name LIKE ?
-                ORDER BY created_at DESC
-            ''', (f'%{keyword}%', f'%{keyword}%'))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            cursor = conn.execute(_SQL_SEARCH_PLANS, (f'%{keyword}%', f'%{keyword}%'))
+            return _rows_to_dicts(cursor)
@@ -15,13 +15,48 @@ from database import TradingPlanDB
 
 logger = logging.getLogger(__name__)
 
+# 解析交易计划的正则,模块级预编译,避免每个计划都走 re 缓存查找
+# 四种字段合并成一个选择分支,finditer 单遍扫完全文(替代四次独立 search)
+_CONDITIONS_RE = re.compile(
+    r'买入价[\uff1a:\s]+[><!\uff1d=]*\s*(?P<entry>\d+(?:\.\d+)?)'
+    r'|止损价[\uff1a:\s]+[><!\uff1d=]*\s*(?P<stop_loss>\d+(?:\.\d+)?)'
+    r'|止盈价[\uff1a:\s]+[><!\uff1d=]*\s*(?P<take_profit>\d+(?:\.\d+)?)'
+    r'|价格[：:\s]+(?P<alt_entry>\d+(?:\.\d+)?)[^\n]*买入'
+)
+
+# 计划未写明止损/止盈时的默认倍数(相对买入价 -5% / +10%)
+_DEFAULT_SL_MULT = 0.95
+_DEFAULT_TP_MULT = 1.10
+
+# 组名到条件字段的映射(alt_entry 仅在没解析到 entry 时兜底)
+_GROUP_TO_FIELD = {
+    'entry': 'entry_price',
+    'stop_loss': 'stop_loss',
+    'take_profit': 'take_profit',
+}
+
 
 class TradingPlanLoader:
     """交易计划加载器"""
     
-    def __init__(self, db_path='data/trading_plans.db'):
-        self.db = TradingPlanDB(db_path)
-    
+    def __init__(self, db_path='data/trading_plans.db', db=None):
+        # 复用调用方已有的 TradingPlanDB,避免同一进程对同一文件开两套连接池
+        self.db = db if db is not None else TradingPlanDB(db_path)
+        # 策略缓存:计划指纹不变时跳过重新加载和正则解析
+        self._last_fingerprint = None
+        self._cached_strategies = None
+        self._cached_max_count = None
+
+    def invalidate_cache(self):
+        """清空策略缓存,下次 load_trading_strategies 强制重新加载
+
+        供显式 reload 场景使用:进程外改库(如直接动 SQLite 文件)
+        不会反映在指纹的进程内写计数上
+        """
+        self._last_fingerprint = None
+        self._cached_strategies = None
+        self._cached_max_count = None
+
     def get_trading_plans(self, max_count: int = 10) -> List[Dict]:
         """
         获取交易计划
@@ -71,47 +106,38 @@ class TradingPlanLoader:
             如果解析失败返回 None
         """
         conditions = {}
-        
-        # 匹配模式: 
-        # 买入价 XXX
-        # 止损价 XXX
-        # 止盈价 XXX
-        
-        # 买入价
-        entry_match = re.search(r'买入价[\uff1a:\s]+[><!\uff1d=]*\s*(\d+(?:\.\d+)?)', plan_content)
-        if entry_match:
-            conditions['entry_price'] = float(entry_match.group(1))
-        
-        # 止损价
-        stop_loss_match = re.search(r'止损价[\uff1a:\s]+[><!\uff1d=]*\s*(\d+(?:\.\d+)?)', plan_content)
-        if stop_loss_match:
-            conditions['stop_loss'] = float(stop_loss_match.group(1))
-                
-        # 止盈价
-        take_profit_match = re.search(r'止盈价[\uff1a:\s]+[><!\uff1d=]*\s*(\d+(?:\.\d+)?)', plan_content)
-        if take_profit_match:
-            conditions['take_profit'] = float(take_profit_match.group(1))
-        
-        # 如果没有找到买入价,尝试其他模式
-        if 'entry_price' not in conditions:
-            # 尝试: 价格：XXX (买入)
-            alt_match = re.search(r'价格[：:\s]+(\d+(?:\.\d+)?)[^\n]*买入', plan_content)
-            if alt_match:
-                conditions['entry_price'] = float(alt_match.group(1))
-        
+        alt_entry = None
+
+        # 匹配模式:
+        # 买入价 XXX / 止损价 XXX / 止盈价 XXX / 价格：XXX ... 买入
+        # 单遍 finditer,按命中的组名分发;同一字段取首次出现(与原多次 search 一致)
+        for match in _CONDITIONS_RE.finditer(plan_content):
+            group = match.lastgroup
+            if group == 'alt_entry':
+                if alt_entry is None:
+                    alt_entry = float(match.group(group))
+            else:
+                conditions.setdefault(_GROUP_TO_FIELD[group], float(match.group(group)))
+
+        # 如果没有找到买入价,兜底用 "价格：XXX (买入)" 模式
+        if 'entry_price' not in conditions and alt_entry is not None:
+            conditions['entry_price'] = alt_entry
+
+
         # 必须至少有买入价才算有效
         if 'entry_price' not in conditions or conditions['entry_price'] == 0:
             logger.warning(f"Could not parse entry price from plan")
             return None
         
         # 如果没有止损/止盈,使用默认值(基于买入价)
+        # %-风格延迟格式化:DEBUG 关闭时不产生任何格式化开销
         if 'stop_loss' not in conditions:
-            conditions['stop_loss'] = conditions['entry_price'] * 0.95  # -5%
-            logger.info(f"Using default stop loss: {conditions['stop_loss']:.2f} (-5%)")
-        
+            conditions['stop_loss'] = conditions['entry_price'] * _DEFAULT_SL_MULT
+            logger.debug("Using default stop loss: %.2f (-5%%)", conditions['stop_loss'])
+
         if 'take_profit' not in conditions:
-            conditions['take_profit'] = conditions['entry_price'] * 1.10  # +10%
-            logger.info(f"Using default take profit: {conditions['take_profit']:.2f} (+10%)")
+            conditions['take_profit'] = conditions['entry_price'] * _DEFAULT_TP_MULT
+            logger.debug("Using default take profit: %.2f (+10%%)", conditions['take_profit'])
         
         return conditions
     
@@ -131,9 +157,17 @@ class TradingPlanLoader:
                 }
             ]
         """
+        # 计划没有变化时直接复用上次的解析结果
+        fingerprint = self.db.get_plans_fingerprint()
+        if (self._cached_strategies is not None
+                and fingerprint == self._last_fingerprint
+                and max_count == self._cached_max_count):
+            logger.debug("Trading plans unchanged, reusing cached strategies")
+            return list(self._cached_strategies)
+
         plans = self.get_trading_plans(max_count)
         strategies = []
-        
+
         for plan in plans:
             conditions = self.parse_trading_conditions(plan['plan_content'])
             
@@ -160,5 +194,8 @@ class TradingPlanLoader:
                 logger.warning(
                     f"Skipping {plan['stock_symbol']} - could not parse trading conditions"
                 )
-        
-        return strategies
+
+        self._last_fingerprint = fingerprint
+        self._cached_strategies = strategies
+        self._cached_max_count = max_count
+        return list(strategies)
@@ -3,6 +3,9 @@ Market Data Provider
 行情数据提供者
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
@@ -14,11 +17,24 @@ logger = logging.getLogger(__name__)
 
 class MarketDataProvider:
     """市场数据提供者"""
-    
+
     def __init__(self):
-        self.cache = {}  # 简单的内存缓存
-        self.cache_ttl = 300  # 缓存5分钟
-    
+        self.cache = {}  # 简单的内存缓存: key -> (单调时间戳, 数据)
+        self.cache_ttl = 300  # ohlcv/quote 缓存5分钟
+        # 价格 TTL 必须低于监控间隔(MONITOR_INTERVAL_SECONDS=300),
+        # 否则下一个 tick 命中上个 tick 的缓存价,等于把刷新率砍半
+        self.price_ttl = 60
+
+    def _cache_get(self, key, ttl=None):
+        """命中且未过期返回缓存数据,否则返回 None"""
+        hit = self.cache.get(key)
+        if hit and time.monotonic() - hit[0] < (ttl or self.cache_ttl):
+            return hit[1]
+        return None
+
+    def _cache_put(self, key, value):
+        self.cache[key] = (time.monotonic(), value)
+
     def get_current_price(self, symbol: str) -> Optional[float]:
         """
         获取股票当前价格
@@ -29,22 +45,103 @@ class MarketDataProvider:
         Returns:
             当前价格,失败返回 None
         """
+        cached = self._cache_get(('price', symbol), self.price_ttl)
+        if cached is not None:
+            return cached
+
         try:
             ticker = yf.Ticker(symbol)
             data = ticker.history(period="1d", interval="1m")
-            
+
             if data.empty:
                 logger.warning(f"No data available for {symbol}")
                 return None
-            
-            current_price = data['Close'].iloc[-1]
+
+            # .values 直取 numpy 数组,绕开 pandas 标签索引机制
+            current_price = float(data['Close'].values[-1])
             logger.info(f"{symbol} current price: ${current_price:.2f}")
-            return float(current_price)
-            
+            self._cache_put(('price', symbol), current_price)
+            return current_price
+
         except Exception as e:
             logger.error(f"Failed to get price for {symbol}: {e}")
             return None
     
+    def get_current_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        批量获取多只股票的当前价格
+
+        一次 yf.download 合并所有请求,替代逐股票的 HTTP 往返
+
+        Args:
+            symbols: 股票代码列表
+
+        Returns:
+            {symbol: price},获取失败的股票不在结果中
+        """
+        if not symbols:
+            return {}
+
+        # 单股票走原路径,省掉多级列索引的处理
+        if len(symbols) == 1:
+            price = self.get_current_price(symbols[0])
+            return {symbols[0]: price} if price is not None else {}
+
+        # 先收缓存,只对过期/缺失的股票发起批量请求
+        prices = {}
+        pending = []
+        for symbol in symbols:
+            cached = self._cache_get(('price', symbol), self.price_ttl)
+            if cached is not None:
+                prices[symbol] = cached
+            else:
+                pending.append(symbol)
+
+        if not pending:
+            return prices
+        symbols = pending
+        cached_count = len(prices)
+
+        try:
+            data = yf.download(
+                tickers=' '.join(symbols),
+                period='2d',
+                interval='1m',
+                progress=False,
+                threads=True,
+                group_by='ticker'
+            )
+
+            for symbol in symbols:
+                try:
+                    closes = data[symbol]['Close'].dropna()
+                    if closes.empty:
+                        logger.warning(f"No data available for {symbol}")
+                        continue
+                    prices[symbol] = float(closes.values[-1])
+                    self._cache_put(('price', symbol), prices[symbol])
+                except (KeyError, IndexError):
+                    logger.warning(f"No data available for {symbol}")
+
+            # prices 里还混着缓存命中,只统计本次批量真正拉到的
+            logger.info(
+                f"Batch fetched prices for "
+                f"{len(prices) - cached_count}/{len(symbols)} symbols"
+            )
+
+        except Exception as e:
+            logger.error(f"Batch price fetch failed for {symbols}: {e}")
+
+        # 批量没拿到的股票用线程池逐只兜底(限流/部分失败时仍约一次 RTT 的墙钟时间)
+        missing = [s for s in symbols if s not in prices]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(10, len(missing))) as pool:
+                for symbol, price in zip(missing, pool.map(self.get_current_price, missing)):
+                    if price is not None:
+                        prices[symbol] = price
+
+        return prices
+
     def get_historical_data(
         self, 
         symbol: str, 
@@ -84,22 +181,29 @@ class MarketDataProvider:
         Returns:
             {'open': float, 'high': float, 'low': float, 'close': float, 'volume': int}
         """
+        cached = self._cache_get(('ohlcv', symbol))
+        if cached is not None:
+            return cached
+
         try:
             ticker = yf.Ticker(symbol)
             data = ticker.history(period="1d")
-            
+
             if data.empty:
                 return None
-            
-            latest = data.iloc[-1]
-            return {
+
+            # 末行按列名 zip 成 dict,避免构造 pandas Series 再逐列标签索引
+            latest = dict(zip(data.columns, data.values[-1]))
+            ohlcv = {
                 'open': float(latest['Open']),
                 'high': float(latest['High']),
                 'low': float(latest['Low']),
                 'close': float(latest['Close']),
                 'volume': int(latest['Volume'])
             }
-            
+            self._cache_put(('ohlcv', symbol), ohlcv)
+            return ohlcv
+
         except Exception as e:
             logger.error(f"Failed to get OHLCV for {symbol}: {e}")
             return None
@@ -111,11 +215,15 @@ class MarketDataProvider:
         Returns:
             包含价格、涨跌幅等信息的字典
         """
+        cached = self._cache_get(('quote', symbol))
+        if cached is not None:
+            return cached
+
         try:
             ticker = yf.Ticker(symbol)
             info = ticker.info
-            
-            return {
+
+            quote = {
                 'symbol': symbol,
                 'current_price': info.get('currentPrice') or info.get('regularMarketPrice'),
                 'previous_close': info.get('previousClose'),
@@ -125,7 +233,9 @@ class MarketDataProvider:
                 'volume': info.get('volume') or info.get('regularMarketVolume'),
                 'market_cap': info.get('marketCap'),
             }
-            
+            self._cache_put(('quote', symbol), quote)
+            return quote
+
         except Exception as e:
             logger.error(f"Failed to get quote for {symbol}: {e}")
             return None
@@ -3,6 +3,8 @@ Trading Monitor - Automated Trading Monitoring Service
 交易监控器 - 自动化交易监控服务
 """
 
+import time
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
 from typing import Optional
@@ -23,36 +25,77 @@ from config import (
 
 logger = logging.getLogger(__name__)
 
+# 仓位上限常量提为模块级,省去热路径里的 config 属性查找
+_MAX_POS = MAX_POSITION_SIZE
+
 
 class TradingMonitor:
     """交易监控器"""
     
-    def __init__(self):
+    def __init__(self, plan_db=None):
         self.account = VirtualAccount(INITIAL_CAPITAL)
         self.strategy = TradingStrategy()
         self.market_data = MarketDataProvider()
-        self.db_loader = TradingPlanLoader()
+        self.db_loader = TradingPlanLoader(db=plan_db)
         self.trade_db = TradeDatabase()
-        self.scheduler = BackgroundScheduler()
+        # coalesce+max_instances=1: 一个 tick 跑慢时合并积压的触发,
+        # 不让多个 monitor_task 线程并发争抢 GIL 和账户状态
+        self.scheduler = BackgroundScheduler(job_defaults={
+            'coalesce': True,
+            'max_instances': 1,
+            'misfire_grace_time': 30,
+        })
         self.is_running = False
+        # monitor_task 期间的日志缓冲;None 表示不缓冲,直接落库
+        self._log_buffer = None
+        # 需要落库的日志级别;None 表示全部持久化
+        # 只关心成交/异常时可设为 {'warning', 'error', 'trade'},
+        # 被过滤的级别连消息字符串都不会构造
+        self._persist_levels = None
         
         # 恢复持仓状态
         self._restore_positions()
         
         logger.info("Trading Monitor initialized")
     
-    def add_log(self, message: str, log_type: str = 'info'):
+    def add_log(self, message: str, log_type: str = 'info', *args):
         """
         添加监控日志（写入数据库）
-        
+
+        monitor_task 执行期间日志先进缓冲,任务结束时批量落库,
+        避免每条日志各自一次提交/fsync
+
+        传入 args 时 message 按 %-风格延迟格式化:
+        级别被 _persist_levels 过滤掉的日志完全不构造字符串
+
         Args:
-            message: 日志消息
+            message: 日志消息(或 % 格式模板)
             log_type: 日志类型 (info/success/warning/error/trade)
+            *args: 格式化参数
         """
+        if self._persist_levels is not None and log_type not in self._persist_levels:
+            return
+        if args:
+            message = message % args
+        if self._log_buffer is not None:
+            self._log_buffer.append(
+                (message, log_type, int(time.time()))
+            )
+            return
         try:
             self.trade_db.save_monitor_log(message, log_type)
         except Exception as e:
             logger.error(f"Failed to save monitor log: {e}")
+
+    def _flush_log_buffer(self):
+        """批量写出并清空日志缓冲"""
+        buffered, self._log_buffer = self._log_buffer, None
+        if not buffered:
+            return
+        try:
+            self.trade_db.save_monitor_logs_bulk(buffered)
+        except Exception as e:
+            logger.error(f"Failed to save monitor logs: {e}")
     
     def get_logs(self, limit: int = 50):
         """
@@ -73,75 +116,57 @@ class TradingMonitor:
     def _restore_positions(self):
         """从数据库恢复持仓状态"""
         try:
-            # 获取所有交易记录
-            trades = self.trade_db.get_all_trades(limit=1000)
-            
-            if not trades:
+            # 聚合在 SQL 内完成,每只股票只回来一行汇总
+            aggregates = self.trade_db.get_position_aggregates()
+
+            if not aggregates:
                 logger.info("没有历史交易记录")
                 return
-            
-            # 计算每个股票的持仓
-            positions_data = {}  # symbol -> {'qty': int, 'total_cost': float}
-            total_commission = 0
-            
-            for trade in reversed(trades):  # 从早到晚处理
-                symbol = trade['symbol']
-                action = trade['action']
-                qty = trade['quantity']
-                price = trade['price']
-                commission = trade.get('commission', 0)
-                total_commission += commission
-                
-                if symbol not in positions_data:
-                    positions_data[symbol] = {'qty': 0, 'total_cost': 0}
-                
-                if action == 'BUY':
-                    positions_data[symbol]['qty'] += qty
-                    positions_data[symbol]['total_cost'] += qty * price
-                elif action == 'SELL':
-                    positions_data[symbol]['qty'] -= qty
-                    # 卖出时按比例减少成本
-                    if positions_data[symbol]['qty'] > 0:
-                        avg_price = positions_data[symbol]['total_cost'] / (positions_data[symbol]['qty'] + qty)
-                        positions_data[symbol]['total_cost'] -= qty * avg_price
-                    else:
-                        positions_data[symbol]['total_cost'] = 0
-            
-            # 清除空仓
-            positions_data = {k: v for k, v in positions_data.items() if v['qty'] > 0}
-            
-            # 计算已用资金
-            total_invested = sum(v['total_cost'] for v in positions_data.values()) + total_commission
-            self.account.cash = INITIAL_CAPITAL - total_invested
-            
+
+            # 计算剩余现金: 初始资金 - (买入支出 - 卖出回款 + 手续费)
+            net_outflow = sum(
+                agg['buy_cost'] - agg['sell_proceeds'] + agg['total_commission']
+                for agg in aggregates
+            )
+            self.account.cash = INITIAL_CAPITAL - net_outflow
+
+            # 只恢复仍有持仓的股票
+            open_positions = [agg for agg in aggregates if agg['qty'] > 0]
+
+            # 批量获取持仓股票的当前价格
+            restored_prices = self.market_data.get_current_prices(
+                [agg['symbol'] for agg in open_positions]
+            )
+
             # 恢复持仓到账户
-            for symbol, data in positions_data.items():
-                if data['qty'] > 0:
-                    avg_price = data['total_cost'] / data['qty']
-                    # 获取当前价格
-                    current_price = self.market_data.get_current_price(symbol)
-                    if current_price is None:
-                        current_price = avg_price  # fallback
-                    
-                    from virtual_account import Position
-                    self.account.positions[symbol] = Position(
-                        symbol=symbol,
-                        quantity=data['qty'],
-                        avg_price=avg_price,
-                        current_price=current_price
-                    )
-                    
-                    # 更新策略中的持仓数量
-                    condition = self.strategy.get_condition(symbol)
-                    if condition:
-                        condition.quantity = data['qty']
-                    
-                    logger.info(f"恢复持仓: {symbol} {data['qty']}股 @ ${avg_price:.2f}")
-                    print(f"   📊 恢复持仓: {symbol} {data['qty']}股 @ ${avg_price:.2f}")
-            
-            if positions_data:
+            for agg in open_positions:
+                symbol = agg['symbol']
+                qty = agg['qty']
+                avg_price = agg['avg_cost']
+                # 获取当前价格(批量结果缺失时回退到成本价)
+                current_price = restored_prices.get(symbol)
+                if current_price is None:
+                    current_price = avg_price  # fallback
+
+                from virtual_account import Position
+                self.account.positions[symbol] = Position(
+                    symbol=symbol,
+                    quantity=qty,
+                    avg_price=avg_price,
+                    current_price=current_price
+                )
+
+                # 更新策略中的持仓数量
+                condition = self.strategy.get_condition(symbol)
+                if condition:
+                    condition.quantity = qty
+
+                logger.info(f"恢复持仓: {symbol} {qty}股 @ ${avg_price:.2f}")
+                print(f"   📊 恢复持仓: {symbol} {qty}股 @ ${avg_price:.2f}")
+
+            if open_positions:
                 print(f"   💰 剩余现金: ${self.account.cash:,.2f}")
-                logger.info(f"持仓恢复完成: {len(positions_data)} 个持仓, 现金 ${self.account.cash:,.2f}")
+                logger.info(f"持仓恢复完成: {len(open_positions)} 个持仓, 现金 ${self.account.cash:,.2f}")
         except Exception as e:
             logger.error(f"恢复持仓失败: {e}")
             print(f"   ⚠️  恢复持仓失败: {e}")
@@ -166,13 +191,16 @@ class TradingMonitor:
         
         # 清空现有策略
         self.strategy.conditions.clear()
-        
+
+        # 持仓映射只取一次,循环里用普通 dict 查找
+        positions_map = self.account.positions
+
         # 添加新策略
         for strat in strategies:
             symbol = strat['symbol']
-            
+
             # 检查是否已有持仓：优先从 account 中获取，其次从之前的 condition
-            position = self.account.get_position(symbol)
+            position = positions_map.get(symbol)
             if position:
                 current_quantity = position.quantity
             elif symbol in existing_positions:
@@ -195,7 +223,7 @@ class TradingMonitor:
         for strat in strategies:
             symbol = strat['symbol']
             starred = "⭐" if strat['is_starred'] else ""
-            position = self.account.get_position(symbol)
+            position = positions_map.get(symbol)
             status = f" [已持仓: {position.quantity}股]" if position else ""
             print(f"   {starred} {symbol} ({strat['name']}){status}")
             print(f"      买入: ${strat['entry_price']:.2f}, 止损: ${strat['stop_loss']:.2f}, 止盈: ${strat['take_profit']:.2f}")
@@ -216,6 +244,14 @@ class TradingMonitor:
             id='trading_monitor',
             name='Trading Monitor Task'
         )
+        # 每日数据库维护：ANALYZE + 增量回收，保持查询计划器统计新鲜
+        self.scheduler.add_job(
+            self.db_loader.db.optimize,
+            'interval',
+            hours=24,
+            id='plan_db_maintenance',
+            name='Plan DB Maintenance'
+        )
         
         self.scheduler.start()
         self.is_running = True
@@ -241,114 +277,147 @@ class TradingMonitor:
         """监控任务 - 定期执行"""
         logger.info("="*60)
         logger.info(f"Monitor task started at {datetime.now()}")
-            
-        # 检查市场是否开盘
-        if not self.market_data.is_market_open():
-            logger.info("Market is closed, skipping monitor task")
-            self.add_log("🚫 交易市场已关闭，等待下次监控", 'info')
-            return
-        
-        # 每次监控前重新加载最新的交易策略
-        logger.info("重新加载交易策略...")
-        count = self.load_strategies_from_db()
-        if count == 0:
-            logger.warning("No strategies loaded from database")
-            self.add_log("⚠️ 没有找到有效的交易计划", 'warning')
-            return
-        
-        symbols = self.strategy.get_all_symbols()
-        
-        if not symbols:
-            logger.info("No symbols to monitor")
-            return
-        
-        print(f"\n🔍 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 执行监控任务...")
-        
-        # 监控每个股票
-        for symbol in symbols:
-            self._monitor_symbol(symbol)
-        
-        # 更新所有持仓的当前价格
-        self._update_positions()
-        
-        # 打印账户摘要
-        self._print_summary()
-        
-        logger.info("Monitor task completed")
-    
-    def _monitor_symbol(self, symbol: str):
+
+        # 本 tick 的日志先进缓冲,finally 里一次性批量落库
+        self._log_buffer = []
+        try:
+            # 检查市场是否开盘
+            if not self.market_data.is_market_open():
+                logger.info("Market is closed, skipping monitor task")
+                self.add_log("🚫 交易市场已关闭，等待下次监控", 'info')
+                return
+
+            # 每次监控前重新加载最新的交易策略
+            logger.info("重新加载交易策略...")
+            count = self.load_strategies_from_db()
+            if count == 0:
+                logger.warning("No strategies loaded from database")
+                self.add_log("⚠️ 没有找到有效的交易计划", 'warning')
+                return
+
+            symbols = self.strategy.get_all_symbols()
+
+            if not symbols:
+                logger.info("No symbols to monitor")
+                return
+
+            print(f"\n🔍 [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 执行监控任务...")
+
+            # 一次批量拉取全部股价(含持仓股票),整个 tick 复用
+            fetch_symbols = set(symbols) | set(self.account.positions.keys())
+            prices = self.market_data.get_current_prices(list(fetch_symbols))
+
+            # 先刷新持仓价格,再对全 tick 计算一次总权益
+            self._update_positions(prices)
+            equity = self.account.total_equity
+
+            # 条件快照:每 tick 取一次元组,热路径用下标访问替代逐次属性查找
+            cond_snapshot = {
+                s: (c.entry_price, c.stop_loss, c.take_profit, c.quantity)
+                for s, c in self.strategy.conditions.items()
+            }
+
+            # 买卖信号整批向量化判定,循环里只按结果分发
+            buys, sells = self.strategy.evaluate_batch(symbols, prices)
+            signals = dict.fromkeys(buys, 'BUY')
+            signals.update(dict.fromkeys(sells, 'SELL'))
+
+            # 监控每个股票
+            for symbol in symbols:
+                executed = self._monitor_symbol(
+                    symbol, prices.get(symbol), equity,
+                    cond_snapshot.get(symbol), signals.get(symbol)
+                )
+                # 有成交才会改变持仓,此时重算权益供后续股票的仓位计算
+                if executed:
+                    equity = self.account.total_equity
+
+            # 打印账户摘要
+            self._print_summary()
+
+            logger.info("Monitor task completed")
+        finally:
+            self._flush_log_buffer()
+
+    def _monitor_symbol(self, symbol: str, current_price: Optional[float],
+                        equity: float, cond: Optional[tuple],
+                        signal: Optional[str]) -> bool:
         """
         监控单个股票
-        
+
         Args:
             symbol: 股票代码
+            current_price: 本 tick 批量获取的当前价格(获取失败为 None)
+            equity: 本 tick 计算好的账户总权益
+            cond: 条件快照元组 (entry_price, stop_loss, take_profit, quantity)
+            signal: evaluate_batch 判定的信号 ('BUY'/'SELL'/None)
+
+        Returns:
+            是否有成交(持仓发生变化)
         """
-        # 获取当前价格
-        current_price = self.market_data.get_current_price(symbol)
-        
         if current_price is None:
             logger.error(f"Failed to get price for {symbol}")
-            self.add_log(f"{symbol}: 无法获取股价", 'error')
-            return
-        
-        # 获取交易条件
-        condition = self.strategy.get_condition(symbol)
-        if not condition:
-            self.add_log(f"{symbol}: 没有交易计划", 'warning')
-            return
-        
-        # 检查买入信号
-        entry_signal = self.strategy.check_entry_signal(symbol, current_price)
-        if entry_signal == 'BUY':
-            # 执行买入
-            self._execute_buy_with_log(symbol, current_price, condition)
-            return
-        
-        # 检查卖出信号
-        exit_signal = self.strategy.check_exit_signal(symbol, current_price)
-        if exit_signal == 'SELL':
+            self.add_log("%s: 无法获取股价", 'error', symbol)
+            return False
+
+        if cond is None:
+            self.add_log("%s: 没有交易计划", 'warning', symbol)
+            return False
+        entry_price, stop_loss, take_profit, quantity = cond
+
+        if signal == 'BUY':
+            # 执行买入(仅成交路径需要条件对象)
+            condition = self.strategy.get_condition(symbol)
+            return self._execute_buy_with_log(symbol, current_price, condition, equity)
+
+        if signal == 'SELL':
             # 执行卖出
-            self._execute_sell_with_log(symbol, current_price, condition)
-            return
-        
-        # 没有触发任何信号
-        if condition.quantity > 0:
+            condition = self.strategy.get_condition(symbol)
+            return self._execute_sell_with_log(symbol, current_price, condition)
+
+        # 没有触发任何信号(每 tick 每股票都会走到,用延迟格式化)
+        if quantity > 0:
             # 持有中
             self.add_log(
-                f"{symbol}: 当前 ${current_price:.2f}, 持有中 (止损 ${condition.stop_loss:.2f}, 止盈 ${condition.take_profit:.2f})",
-                'info'
+                "%s: 当前 $%.2f, 持有中 (止损 $%.2f, 止盈 $%.2f)",
+                'info', symbol, current_price, stop_loss, take_profit
             )
         else:
             # 未持仓，未满足买入条件
-            if current_price > condition.entry_price:
+            if current_price > entry_price:
                 self.add_log(
-                    f"{symbol}: 当前 ${current_price:.2f}, 价格高于买入价 ${condition.entry_price:.2f}, 未买入",
-                    'info'
+                    "%s: 当前 $%.2f, 价格高于买入价 $%.2f, 未买入",
+                    'info', symbol, current_price, entry_price
                 )
             else:
                 self.add_log(
-                    f"{symbol}: 当前 ${current_price:.2f}, 未满足买入条件 (买入价 ${condition.entry_price:.2f})",
-                    'info'
+                    "%s: 当前 $%.2f, 未满足买入条件 (买入价 $%.2f)",
+                    'info', symbol, current_price, entry_price
                 )
-    
-    def _execute_buy_with_log(self, symbol: str, price: float, condition):
+        return False
+
+    def _execute_buy_with_log(self, symbol: str, price: float, condition,
+                              equity: float) -> bool:
         """
         执行买入并记录单行日志
-        
+
         Args:
             symbol: 股票代码
             price: 买入价格
             condition: 交易条件
+            equity: 本 tick 计算好的账户总权益
+
+        Returns:
+            是否买入成功
         """
-        # 计算买入数量
-        max_investment = self.account.total_equity * MAX_POSITION_SIZE
-        affordable_qty = int(max_investment / price)
-        
+        # 计算买入数量(地板除替代除后取整,少一次中间转换)
+        affordable_qty = int(equity * _MAX_POS // price)
+
         if affordable_qty < 1:
             logger.warning(f"Insufficient funds to buy {symbol}")
             self.add_log(f"{symbol}: 当前 ${price:.2f}, 资金不足无法买入", 'warning')
-            return
-        
+            return False
+
         # 计算手续费
         commission = price * affordable_qty * COMMISSION_RATE
         
@@ -379,21 +448,25 @@ class TradingMonitor:
         else:
             logger.error(f"BUY failed for {symbol}")
             self.add_log(f"{symbol}: 买入失败", 'error')
-    
-    def _execute_sell_with_log(self, symbol: str, price: float, condition):
+        return success
+
+    def _execute_sell_with_log(self, symbol: str, price: float, condition) -> bool:
         """
         执行卖出并记录单行日志
-        
+
         Args:
             symbol: 股票代码
             price: 卖出价格
             condition: 交易条件
+
+        Returns:
+            是否卖出成功
         """
         position = self.account.get_position(symbol)
         if not position:
             logger.warning(f"No position to sell for {symbol}")
-            return
-        
+            return False
+
         quantity = position.quantity
         commission = price * quantity * COMMISSION_RATE
         
@@ -438,19 +511,25 @@ class TradingMonitor:
         else:
             logger.error(f"SELL failed for {symbol}")
             self.add_log(f"{symbol}: 卖出失败", 'error')
+        return success
     
-    def _update_positions(self):
-        """更新所有持仓的当前价格"""
+    def _update_positions(self, prices: dict):
+        """
+        更新所有持仓的当前价格
+
+        Args:
+            prices: 本 tick 批量获取的 {symbol: price}
+        """
         if not self.account.positions:
             return
-        
-        prices = {}
-        for symbol in self.account.positions.keys():
-            price = self.market_data.get_current_price(symbol)
-            if price:
-                prices[symbol] = price
-        
-        self.account.update_prices(prices)
+
+        updates = {
+            symbol: prices[symbol]
+            for symbol in self.account.positions.keys()
+            if symbol in prices
+        }
+
+        self.account.update_prices(updates)
     
     def _print_summary(self):
         """打印账户摘要"""
@@ -474,21 +553,24 @@ class TradingMonitor:
         # 显示持仓
         if self.account.positions:
             print(f"\n📊 当前持仓:")
+            snapshot_rows = []
             for pos in self.account.get_positions_list():
                 pnl_emoji = "📈" if pos['unrealized_pnl'] >= 0 else "📉"
                 print(f"   {pnl_emoji} {pos['symbol']}: {pos['quantity']} 股")
                 print(f"      成本: ${pos['avg_price']:.2f}, 当前: ${pos['current_price']:.2f}")
                 print(f"      盈亏: ${pos['unrealized_pnl']:.2f} ({pos['unrealized_pnl_pct']:+.2f}%)")
-                
-                # 保存持仓快照
-                self.trade_db.save_position_snapshot(
-                    symbol=pos['symbol'],
-                    quantity=pos['quantity'],
-                    avg_price=pos['avg_price'],
-                    current_price=pos['current_price'],
-                    unrealized_pnl=pos['unrealized_pnl'],
-                    unrealized_pnl_pct=pos['unrealized_pnl_pct']
-                )
+
+                snapshot_rows.append((
+                    pos['symbol'],
+                    pos['quantity'],
+                    pos['avg_price'],
+                    pos['current_price'],
+                    pos['unrealized_pnl'],
+                    pos['unrealized_pnl_pct']
+                ))
+
+            # 整个 tick 的持仓快照一次批量落库
+            self.trade_db.save_position_snapshots(snapshot_rows)
     
     def get_account_summary(self) -> dict:
         """获取账户摘要"""
@@ -511,9 +593,13 @@ class TradingMonitor:
 _monitor_instance: Optional[TradingMonitor] = None
 
 
-def get_monitor() -> TradingMonitor:
-    """获取监控器单例"""
+def get_monitor(plan_db=None) -> TradingMonitor:
+    """获取监控器单例
+
+    Args:
+        plan_db: 可选的共享 TradingPlanDB 实例(首次创建时生效)
+    """
     global _monitor_instance
     if _monitor_instance is None:
-        _monitor_instance = TradingMonitor()
+        _monitor_instance = TradingMonitor(plan_db=plan_db)
     return _monitor_instance
@@ -4,7 +4,10 @@ Trade Database for Mock Trading
 """
 
 import sqlite3
+import atexit
 import json
+import queue
+import time
 from datetime import datetime
 from contextlib import contextmanager
 from typing import List, Dict, Optional
@@ -12,22 +15,122 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 连接池大小(与 database.py 保持一致:写者串行,少量连接够用)
+POOL_SIZE = 4
+
+# 热路径 SQL 常量:文本稳定才能命中连接的语句缓存,免去重复 parse/plan
+_SQL_INSERT_TRADE = '''
+    INSERT INTO trades
+    (symbol, action, quantity, price, commission, plan_id, notes, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 监控热路径大多是零手续费/无计划/无备注:窄版语句少绑三个参数,
+# commission/plan_id/notes 落表默认值,WAL 每行少写若干字节
+_SQL_INSERT_TRADE_DEFAULTS = '''
+    INSERT INTO trades (symbol, action, quantity, price, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_POSITION_SNAPSHOT = '''
+    INSERT INTO position_snapshots
+    (symbol, quantity, avg_price, current_price,
+     unrealized_pnl, unrealized_pnl_pct, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_ACCOUNT_SNAPSHOT = '''
+    INSERT INTO account_snapshots
+    (cash, market_value, total_equity, total_pnl, total_pnl_pct, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_MONITOR_LOG = '''
+    INSERT INTO monitor_logs (message, log_type, timestamp)
+    VALUES (?, ?, ?)
+'''
+
+# 统计汇总表的增量维护:每笔交易顺手 upsert 一行,查询端不再扫 trades
+_SQL_UPSERT_STATS_ROLLUP = '''
+    INSERT INTO trade_stats_rollup
+    (symbol, buy_count, sell_count, total_commission, total_trades)
+    VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT(symbol) DO UPDATE SET
+        buy_count = buy_count + excluded.buy_count,
+        sell_count = sell_count + excluded.sell_count,
+        total_commission = total_commission + excluded.total_commission,
+        total_trades = total_trades + 1
+'''
+
 
 class TradeDatabase:
     """交易数据库管理"""
-    
+
     def __init__(self, db_path='data/mock_trades.db'):
         self.db_path = db_path
         # 确保数据目录存在
         import os
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # 常驻连接池:免去每次读写的 connect/close 开销
+        self._pool = queue.Queue(maxsize=POOL_SIZE)
+        self._fresh_db = not os.path.exists(db_path) or os.path.getsize(db_path) == 0
+        # 热查询缓存:数据只在成交/快照写入时变化,轮询端读缓存即可
+        # (写计数作版本号,save_trade 递增使统计缓存失效)
+        self._trades_version = 0
+        self._stats_cache = (-1, None)
+        self._latest_snapshot = None
+        self._latest_snapshot_loaded = False
+        if self._fresh_db and ':memory:' not in db_path:
+            self._init_page_layout()
         self.init_db()
+        atexit.register(self.close)
+
+    def _init_page_layout(self):
+        """全新库:8K 页 + 增量空闲页回收
+
+        快照表是只追加的时序数据,8K 页能多装行、减少 ORDER BY timestamp
+        扫描的 IO;两个设置都只能在库文件初始化(进 WAL)之前写入库头,
+        所以用一条未调优的裸连接先 VACUUM 落盘
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA page_size=8192')
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
     
+    def _tune_connection(self, conn):
+        """应用性能 PRAGMA (WAL 读写不互斥, NORMAL 减少 fsync)"""
+        # 内存库不落盘,日志/同步调优无意义
+        if ':memory:' in self.db_path:
+            return
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-20000')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.execute('PRAGMA mmap_size=268435456')
+        except sqlite3.OperationalError:
+            # WAL 需要目录可写,失败时退回默认日志模式
+            pass
+
+    def _create_connection(self):
+        """创建并调优一个新连接"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        self._tune_connection(conn)
+        return conn
+
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for pooled database connections"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._create_connection()
         try:
             yield conn
             conn.commit()
@@ -35,11 +138,33 @@ class TradeDatabase:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                # 顺手回收一批空闲页(auto_vacuum=INCREMENTAL 的库才有动作)
+                conn.execute('PRAGMA incremental_vacuum(1000)')
+                # SQLite 官方建议的关闭前钩子:按本连接的查询历史
+                # 视需要刷新统计信息,通常近乎免费
+                conn.execute('PRAGMA optimize')
+                conn.close()
+            except sqlite3.Error:
+                pass
     
     def init_db(self):
-        """初始化数据库表"""
+        """初始化数据库表(单事务原子完成,避免部分建表/建索引的中间态)"""
         with self.get_connection() as conn:
+            # DDL 默认逐条自动提交;显式开事务让全部建表/建索引一次 fsync
+            conn.execute('BEGIN IMMEDIATE')
             # 交易记录表
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS trades (
@@ -49,7 +174,7 @@ class TradeDatabase:
                     quantity INTEGER NOT NULL,
                     price REAL NOT NULL,
                     commission REAL DEFAULT 0,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    timestamp INTEGER DEFAULT (strftime('%s', 'now')),
                     plan_id INTEGER,
                     notes TEXT
                 )
@@ -65,7 +190,7 @@ class TradeDatabase:
                     current_price REAL NOT NULL,
                     unrealized_pnl REAL,
                     unrealized_pnl_pct REAL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    timestamp INTEGER DEFAULT (strftime('%s', 'now'))
                 )
             ''')
             
@@ -78,7 +203,7 @@ class TradeDatabase:
                     total_equity REAL NOT NULL,
                     total_pnl REAL NOT NULL,
                     total_pnl_pct REAL NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    timestamp INTEGER DEFAULT (strftime('%s', 'now'))
                 )
             ''')
             
@@ -88,13 +213,62 @@ class TradeDatabase:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     message TEXT NOT NULL,
                     log_type TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    timestamp INTEGER DEFAULT (strftime('%s', 'now'))
                 )
             ''')
             
+            # 迁移:旧库的 TEXT 时间戳就地转为整数 epoch
+            # (数值 B-tree 比较远快于 19 字节字符串;写入端均显式传 epoch,
+            #  旧表残留的 CURRENT_TIMESTAMP 默认值不会再被用到)
+            if conn.execute('PRAGMA user_version').fetchone()[0] < 1:
+                if not self._fresh_db:
+                    # CURRENT_TIMESTAMP 写的是 UTC 字符串,直接取 %s
+                    for table in ('trades', 'position_snapshots',
+                                  'account_snapshots'):
+                        conn.execute(f'''
+                            UPDATE {table}
+                            SET timestamp = CAST(strftime('%s', timestamp) AS INTEGER)
+                            WHERE typeof(timestamp) = 'text'
+                        ''')
+                    # monitor_logs 由 Python 按本地时间写入,先按 localtime 解释
+                    conn.execute('''
+                        UPDATE monitor_logs
+                        SET timestamp = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+                        WHERE typeof(timestamp) = 'text'
+                    ''')
+                conn.execute('PRAGMA user_version = 1')
+
+            # 交易统计汇总表(按股票一行,save_trade 增量维护)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trade_stats_rollup (
+                    symbol TEXT PRIMARY KEY,
+                    buy_count INTEGER NOT NULL DEFAULT 0,
+                    sell_count INTEGER NOT NULL DEFAULT 0,
+                    total_commission REAL NOT NULL DEFAULT 0,
+                    total_trades INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+
+            # 老库首次升级:从存量 trades 回填汇总
+            rollup_rows = conn.execute(
+                'SELECT COUNT(*) FROM trade_stats_rollup').fetchone()[0]
+            if rollup_rows == 0:
+                conn.execute('''
+                    INSERT INTO trade_stats_rollup
+                    (symbol, buy_count, sell_count, total_commission, total_trades)
+                    SELECT
+                        symbol,
+                        SUM(CASE WHEN action = 'BUY' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN action = 'SELL' THEN 1 ELSE 0 END),
+                        COALESCE(SUM(commission), 0),
+                        COUNT(*)
+                    FROM trades
+                    GROUP BY symbol
+                ''')
+
             # 创建索引
             conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_trades_symbol 
+                CREATE INDEX IF NOT EXISTS idx_trades_symbol
                 ON trades(symbol, timestamp DESC)
             ''')
             conn.execute('''
@@ -102,9 +276,22 @@ class TradeDatabase:
                 ON trades(timestamp DESC)
             ''')
             conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_monitor_logs_timestamp 
+                CREATE INDEX IF NOT EXISTS idx_monitor_logs_timestamp
                 ON monitor_logs(timestamp DESC)
             ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_position_snapshots_symbol
+                ON position_snapshots(symbol, timestamp DESC)
+            ''')
+            # 覆盖索引:get_account_snapshots 只取这两列,可纯走索引免回表
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_account_snap_ts
+                ON account_snapshots(timestamp, total_equity)
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_position_snap_ts
+                ON position_snapshots(timestamp)
+            ''')
     
     def save_trade(
         self, 
@@ -132,37 +319,90 @@ class TradeDatabase:
             交易记录ID
         """
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO trades 
-                (symbol, action, quantity, price, commission, plan_id, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (symbol, action, quantity, price, commission, plan_id, notes))
+            if not commission and plan_id is None and notes is None:
+                cursor = conn.execute(_SQL_INSERT_TRADE_DEFAULTS,
+                                      (symbol, action, quantity, price,
+                                       int(time.time())))
+            else:
+                cursor = conn.execute(_SQL_INSERT_TRADE,
+                                      (symbol, action, quantity, price, commission,
+                                       plan_id, notes, int(time.time())))
+            # 同一事务内维护统计汇总
+            conn.execute(_SQL_UPSERT_STATS_ROLLUP, (
+                symbol,
+                1 if action == 'BUY' else 0,
+                1 if action == 'SELL' else 0,
+                commission
+            ))
             
             trade_id = cursor.lastrowid
-            logger.info(
-                f"Saved trade: {action} {quantity} {symbol} @ ${price:.2f} "
-                f"(ID: {trade_id})"
-            )
-            return trade_id
+
+        self._trades_version += 1
+        logger.info(
+            f"Saved trade: {action} {quantity} {symbol} @ ${price:.2f} "
+            f"(ID: {trade_id})"
+        )
+        return trade_id
     
     def get_all_trades(self, limit: int = 100) -> List[Dict]:
         """获取所有交易记录"""
+        # timestamp 存整数 epoch,仅在投影时格式化,排序走数值比较
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT * FROM trades 
-                ORDER BY timestamp DESC 
+                SELECT id, symbol, action, quantity, price, commission,
+                       strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp,
+                       plan_id
+                FROM trades
+                ORDER BY trades.timestamp DESC
                 LIMIT ?
             ''', (limit,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    def get_position_aggregates(self) -> List[Dict]:
+        """按股票聚合全部交易,返回持仓重建所需的汇总值
+
+        聚合在 SQLite 内完成,Python 侧工作量与股票数(而非交易数)成正比
+
+        Returns:
+            [{'symbol', 'qty', 'avg_cost', 'buy_cost',
+              'sell_proceeds', 'total_commission'}]
+            avg_cost 为买入加权均价(buy_cost / buy_qty)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute('''
+                SELECT
+                    symbol,
+                    SUM(CASE WHEN action = 'BUY' THEN quantity ELSE -quantity END) AS qty,
+                    SUM(CASE WHEN action = 'BUY' THEN quantity ELSE 0 END) AS buy_qty,
+                    SUM(CASE WHEN action = 'BUY' THEN quantity * price ELSE 0 END) AS buy_cost,
+                    SUM(CASE WHEN action = 'SELL' THEN quantity * price ELSE 0 END) AS sell_proceeds,
+                    SUM(commission) AS total_commission
+                FROM trades
+                GROUP BY symbol
+            ''')
+            aggregates = []
+            for row in cursor.fetchall():
+                aggregates.append({
+                    'symbol': row['symbol'],
+                    'qty': row['qty'],
+                    'avg_cost': row['buy_cost'] / row['buy_qty'] if row['buy_qty'] else 0.0,
+                    'buy_cost': row['buy_cost'],
+                    'sell_proceeds': row['sell_proceeds'],
+                    'total_commission': row['total_commission'] or 0,
+                })
+            return aggregates
+
     def get_trades_by_symbol(self, symbol: str) -> List[Dict]:
         """获取指定股票的交易记录"""
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT * FROM trades 
+                SELECT id, symbol, action, quantity, price, commission,
+                       strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp,
+                       plan_id
+                FROM trades
                 WHERE symbol = ?
-                ORDER BY timestamp DESC
+                ORDER BY trades.timestamp DESC
             ''', (symbol,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
@@ -178,16 +418,27 @@ class TradeDatabase:
     ):
         """保存持仓快照"""
         with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO position_snapshots
-                (symbol, quantity, avg_price, current_price, 
-                 unrealized_pnl, unrealized_pnl_pct)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            conn.execute(_SQL_INSERT_POSITION_SNAPSHOT, (
                 symbol, quantity, avg_price, current_price,
-                unrealized_pnl, unrealized_pnl_pct
+                unrealized_pnl, unrealized_pnl_pct, int(time.time())
             ))
     
+    def save_position_snapshots(self, rows: List[tuple]):
+        """
+        批量保存持仓快照(一个 tick 的快照共用一个事务)
+
+        Args:
+            rows: [(symbol, quantity, avg_price, current_price,
+                    unrealized_pnl, unrealized_pnl_pct), ...]
+        """
+        if not rows:
+            return
+        # 同一 tick 的快照共享一个时间戳
+        ts = int(time.time())
+        with self.get_connection() as conn:
+            conn.executemany(_SQL_INSERT_POSITION_SNAPSHOT,
+                             [row + (ts,) for row in rows])
+
     def save_account_snapshot(
         self,
         cash: float,
@@ -197,30 +448,51 @@ class TradeDatabase:
         total_pnl_pct: float
     ):
         """保存账户快照"""
+        ts = int(time.time())
         with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO account_snapshots
-                (cash, market_value, total_equity, total_pnl, total_pnl_pct)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (cash, market_value, total_equity, total_pnl, total_pnl_pct))
+            cursor = conn.execute(_SQL_INSERT_ACCOUNT_SNAPSHOT,
+                                  (cash, market_value, total_equity, total_pnl,
+                                   total_pnl_pct, ts))
+        # 刚写入的行就是"最新快照",直接回填缓存,读端不必再 SELECT
+        self._latest_snapshot = {
+            'id': cursor.lastrowid,
+            'cash': cash,
+            'market_value': market_value,
+            'total_equity': total_equity,
+            'total_pnl': total_pnl,
+            'total_pnl_pct': total_pnl_pct,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)),
+        }
+        self._latest_snapshot_loaded = True
     
     def get_latest_account_snapshot(self) -> Optional[Dict]:
         """获取最新的账户快照"""
+        # save_account_snapshot 写入时同步回填,命中后零 SQL
+        if self._latest_snapshot_loaded:
+            snap = self._latest_snapshot
+            return dict(snap) if snap else None
+
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT * FROM account_snapshots 
-                ORDER BY timestamp DESC 
+                SELECT id, cash, market_value, total_equity, total_pnl, total_pnl_pct,
+                       strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp
+                FROM account_snapshots
+                ORDER BY account_snapshots.timestamp DESC
                 LIMIT 1
             ''')
             row = cursor.fetchone()
+            self._latest_snapshot = dict(row) if row else None
+            self._latest_snapshot_loaded = True
             return dict(row) if row else None
     
     def get_account_history(self, limit: int = 100) -> List[Dict]:
         """获取账户历史快照"""
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT * FROM account_snapshots 
-                ORDER BY timestamp DESC 
+                SELECT id, cash, market_value, total_equity, total_pnl, total_pnl_pct,
+                       strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp
+                FROM account_snapshots
+                ORDER BY account_snapshots.timestamp DESC
                 LIMIT ?
             ''', (limit,))
             rows = cursor.fetchall()
@@ -237,55 +509,52 @@ class TradeDatabase:
             if time_range == 'all':
                 # 获取所有数据（不限制limit）
                 cursor = conn.execute('''
-                    SELECT timestamp, total_equity 
-                    FROM account_snapshots 
-                    ORDER BY timestamp ASC
+                    SELECT strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp,
+                           total_equity
+                    FROM account_snapshots
+                    ORDER BY account_snapshots.timestamp ASC
                 ''')
             else:
                 # 默认：最近N条
                 cursor = conn.execute('''
-                    SELECT timestamp, total_equity 
-                    FROM account_snapshots 
-                    ORDER BY timestamp ASC 
+                    SELECT strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch') AS timestamp,
+                           total_equity
+                    FROM account_snapshots
+                    ORDER BY account_snapshots.timestamp ASC
                     LIMIT ?
                 ''', (limit,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
     def get_trading_stats(self) -> Dict:
-        """获取交易统计"""
+        """获取交易统计(读预聚合的汇总表,每股票一行)"""
+        # 版本号未变说明期间没有新成交,直接出缓存
+        version, cached = self._stats_cache
+        if cached is not None and version == self._trades_version:
+            return dict(cached)
+
         with self.get_connection() as conn:
-            # 总交易次数
-            cursor = conn.execute('SELECT COUNT(*) as total FROM trades')
-            total_trades = cursor.fetchone()[0]
-            
-            # 买入次数
-            cursor = conn.execute(
-                "SELECT COUNT(*) as total FROM trades WHERE action = 'BUY'"
-            )
-            buy_count = cursor.fetchone()[0]
-            
-            # 卖出次数
-            cursor = conn.execute(
-                "SELECT COUNT(*) as total FROM trades WHERE action = 'SELL'"
-            )
-            sell_count = cursor.fetchone()[0]
-            
-            # 总手续费
-            cursor = conn.execute('SELECT SUM(commission) as total FROM trades')
-            total_commission = cursor.fetchone()[0] or 0
-            
-            # 交易的股票数量
-            cursor = conn.execute('SELECT COUNT(DISTINCT symbol) as total FROM trades')
-            unique_symbols = cursor.fetchone()[0]
-            
-            return {
+            cursor = conn.execute('''
+                SELECT
+                    COALESCE(SUM(total_trades), 0),
+                    COALESCE(SUM(buy_count), 0),
+                    COALESCE(SUM(sell_count), 0),
+                    COALESCE(SUM(total_commission), 0),
+                    COUNT(*)
+                FROM trade_stats_rollup
+            ''')
+            total_trades, buy_count, sell_count, total_commission, unique_symbols = \
+                cursor.fetchone()
+
+            stats = {
                 'total_trades': total_trades,
                 'buy_count': buy_count,
                 'sell_count': sell_count,
                 'total_commission': total_commission,
                 'unique_symbols': unique_symbols
             }
+            self._stats_cache = (self._trades_version, stats)
+            return dict(stats)
     
     def save_monitor_log(self, message: str, log_type: str = 'info'):
         """
@@ -295,16 +564,22 @@ class TradeDatabase:
             message: 日志消息
             log_type: 日志类型 (info/success/warning/error/trade)
         """
-        # 使用当前系统时间（已配置为美东时间）
-        from datetime import datetime
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
         with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO monitor_logs (message, log_type, timestamp)
-                VALUES (?, ?, ?)
-            ''', (message, log_type, current_time))
+            conn.execute(_SQL_INSERT_MONITOR_LOG,
+                         (message, log_type, int(time.time())))
     
+    def save_monitor_logs_bulk(self, rows: List[tuple]):
+        """
+        批量保存监控日志(单事务单次 fsync,替代逐条 INSERT)
+
+        Args:
+            rows: [(message, log_type, epoch_ts), ...]
+        """
+        if not rows:
+            return
+        with self.get_connection() as conn:
+            conn.executemany(_SQL_INSERT_MONITOR_LOG, rows)
+
     def get_monitor_logs(self, limit: int = 50) -> List[Dict]:
         """
         获取监控日志
@@ -315,16 +590,18 @@ class TradeDatabase:
         Returns:
             list: 日志列表
         """
+        # 排序/筛选走整数 epoch,仅在投影时按本地时间格式化;
+        # 内层先按索引取最近 limit 条,外层重排为正序,免去 Python 侧 reversed()
         with self.get_connection() as conn:
             cursor = conn.execute('''
-                SELECT 
-                    strftime('%Y-%m-%d %H:%M:%S', timestamp) as timestamp,
-                    message,
-                    log_type as type
-                FROM monitor_logs
-                ORDER BY timestamp DESC
-                LIMIT ?
+                SELECT strftime('%Y-%m-%d %H:%M:%S', timestamp,
+                                'unixepoch', 'localtime') AS timestamp,
+                       message, log_type AS type
+                FROM (
+                    SELECT * FROM monitor_logs
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ) sub
+                ORDER BY sub.timestamp ASC, id ASC
             ''', (limit,))
-            rows = cursor.fetchall()
-            # 按时间正序返回（最旧的在前）
-            return [dict(row) for row in reversed(rows)]
+            return [dict(row) for row in cursor.fetchall()]
@@ -3,14 +3,19 @@ Trading Strategy - Trading Signal Detection
 交易策略 - 交易信号检测
 """
 
-from typing import Dict, Optional, List
-from dataclasses import dataclass
+from typing import Dict, Optional, List, Tuple
+from dataclasses import dataclass, field
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# 价格容差百分比（1%）
+PRICE_TOLERANCE = 0.01
+
 
-@dataclass
+@dataclass(slots=True)
 class TradingCondition:
     """交易条件"""
     symbol: str
@@ -18,18 +23,40 @@ class TradingCondition:
     stop_loss: Optional[float] = None    # 止损价格
     take_profit: Optional[float] = None  # 止盈价格
     quantity: int = 0                     # 持仓数量
-    
+
     # 条件类型
     entry_condition: str = 'price'  # price, breakout, pullback
     exit_condition: str = 'fixed'   # fixed, trailing, percentage
 
+    # 触发区间在创建时一次算好,热路径每 tick 只做比较不做乘法;
+    # 未设置的价位保持 NaN,任何比较天然判 False
+    entry_lo: float = field(init=False, default=float('nan'), repr=False)
+    entry_hi: float = field(init=False, default=float('nan'), repr=False)
+    stop_lo: float = field(init=False, default=float('nan'), repr=False)
+    stop_hi: float = field(init=False, default=float('nan'), repr=False)
+    tp_lo: float = field(init=False, default=float('nan'), repr=False)
+    tp_hi: float = field(init=False, default=float('nan'), repr=False)
+
+    def __post_init__(self):
+        lower = 1 - PRICE_TOLERANCE
+        upper = 1 + PRICE_TOLERANCE
+        if self.entry_price is not None:
+            self.entry_lo = self.entry_price * lower
+            self.entry_hi = self.entry_price * upper
+        if self.stop_loss is not None:
+            self.stop_lo = self.stop_loss * lower
+            self.stop_hi = self.stop_loss * upper
+        if self.take_profit is not None:
+            self.tp_lo = self.take_profit * lower
+            self.tp_hi = self.take_profit * upper
+
 
 class TradingStrategy:
     """交易策略引擎"""
-    
-    # 价格容差百分比（1%）
-    PRICE_TOLERANCE = 0.01
-    
+
+    # 兼容旧引用;区间本身已缓存在 TradingCondition 上
+    PRICE_TOLERANCE = PRICE_TOLERANCE
+
     def __init__(self):
         self.conditions: Dict[str, TradingCondition] = {}
     
@@ -77,15 +104,12 @@ class TradingStrategy:
         if condition.entry_price is None:
             return None
         
-        # 买入价格区间: 买入价 * (1 ± 1%)
-        entry_lower = condition.entry_price * (1 - self.PRICE_TOLERANCE)
-        entry_upper = condition.entry_price * (1 + self.PRICE_TOLERANCE)
-        
-        # 在买入价格区间内触发
-        if entry_lower <= current_price <= entry_upper:
+        # 在预计算的买入区间 [买入价*(1-1%), 买入价*(1+1%)] 内触发
+        if condition.entry_lo <= current_price <= condition.entry_hi:
             logger.info(
                 f"BUY signal for {symbol}: "
-                f"current ${current_price:.2f} in range [${entry_lower:.2f}, ${entry_upper:.2f}] "
+                f"current ${current_price:.2f} in range "
+                f"[${condition.entry_lo:.2f}, ${condition.entry_hi:.2f}] "
                 f"(entry ${condition.entry_price:.2f} ±1%)"
             )
             return 'BUY'
@@ -116,34 +140,97 @@ class TradingStrategy:
         if condition.quantity == 0:
             return None
         
-        # 检查止损: 止损价 * (1 ± 1%)
-        if condition.stop_loss:
-            stop_loss_lower = condition.stop_loss * (1 - self.PRICE_TOLERANCE)
-            stop_loss_upper = condition.stop_loss * (1 + self.PRICE_TOLERANCE)
-            
-            if stop_loss_lower <= current_price <= stop_loss_upper:
-                logger.warning(
-                    f"STOP LOSS triggered for {symbol}: "
-                    f"current ${current_price:.2f} in range [${stop_loss_lower:.2f}, ${stop_loss_upper:.2f}] "
-                    f"(stop loss ${condition.stop_loss:.2f} ±1%)"
-                )
-                return 'SELL'
-        
-        # 检查止盈: 止盈价 * (1 ± 1%)
-        if condition.take_profit:
-            take_profit_lower = condition.take_profit * (1 - self.PRICE_TOLERANCE)
-            take_profit_upper = condition.take_profit * (1 + self.PRICE_TOLERANCE)
-            
-            if take_profit_lower <= current_price <= take_profit_upper:
-                logger.info(
-                    f"TAKE PROFIT triggered for {symbol}: "
-                    f"current ${current_price:.2f} in range [${take_profit_lower:.2f}, ${take_profit_upper:.2f}] "
-                    f"(take profit ${condition.take_profit:.2f} ±1%)"
-                )
-                return 'SELL'
+        # 检查止损: 预计算区间 止损价 * (1 ± 1%)
+        if condition.stop_lo <= current_price <= condition.stop_hi:
+            logger.warning(
+                f"STOP LOSS triggered for {symbol}: "
+                f"current ${current_price:.2f} in range "
+                f"[${condition.stop_lo:.2f}, ${condition.stop_hi:.2f}] "
+                f"(stop loss ${condition.stop_loss:.2f} ±1%)"
+            )
+            return 'SELL'
+
+        # 检查止盈: 预计算区间 止盈价 * (1 ± 1%)
+        if condition.tp_lo <= current_price <= condition.tp_hi:
+            logger.info(
+                f"TAKE PROFIT triggered for {symbol}: "
+                f"current ${current_price:.2f} in range "
+                f"[${condition.tp_lo:.2f}, ${condition.tp_hi:.2f}] "
+                f"(take profit ${condition.take_profit:.2f} ±1%)"
+            )
+            return 'SELL'
         
         return None
     
+    def evaluate_batch(
+        self,
+        symbols: List[str],
+        prices: Dict[str, float]
+    ) -> Tuple[List[str], List[str]]:
+        """
+        批量评估所有股票的买卖信号(NumPy 向量化)
+
+        比较逻辑与 check_entry_signal / check_exit_signal 一致,
+        但所有股票的区间判断在 C 层一次算完,价格缺失或条件为 None
+        的股票以 NaN 参与比较,天然判 False
+
+        Args:
+            symbols: 股票代码列表
+            prices: {symbol: price},缺失的股票不会触发信号
+
+        Returns:
+            (买入信号的股票列表, 卖出信号的股票列表)
+        """
+        if not symbols:
+            return [], []
+
+        conds = [self.conditions.get(s) for s in symbols]
+
+        def _column(getter):
+            return np.array([
+                getter(c) if c is not None else np.nan for c in conds
+            ], dtype=float)
+
+        price_arr = np.array(
+            [prices.get(s, np.nan) for s in symbols], dtype=float
+        )
+        # 区间上下界在条件创建时已算好,这里纯 gather + 比较
+        entry_lo = _column(lambda c: c.entry_lo)
+        entry_hi = _column(lambda c: c.entry_hi)
+        stop_lo = _column(lambda c: c.stop_lo)
+        stop_hi = _column(lambda c: c.stop_hi)
+        tp_lo = _column(lambda c: c.tp_lo)
+        tp_hi = _column(lambda c: c.tp_hi)
+        qty = np.array([c.quantity if c is not None else 0 for c in conds])
+
+        buy_mask = (
+            (qty == 0)
+            & (price_arr >= entry_lo)
+            & (price_arr <= entry_hi)
+        )
+        sell_mask = (qty > 0) & (
+            ((price_arr >= stop_lo) & (price_arr <= stop_hi))
+            | ((price_arr >= tp_lo) & (price_arr <= tp_hi))
+        )
+
+        buys = [symbols[i] for i in np.nonzero(buy_mask)[0]]
+        sells = [symbols[i] for i in np.nonzero(sell_mask)[0]]
+
+        # 触发的股票很少,逐个打日志与原单股票路径保持同等可观测性
+        for symbol in buys:
+            logger.info(
+                f"BUY signal for {symbol}: "
+                f"current ${prices[symbol]:.2f} within entry band "
+                f"(entry ${self.conditions[symbol].entry_price:.2f} ±1%)"
+            )
+        for symbol in sells:
+            logger.info(
+                f"SELL signal for {symbol}: "
+                f"current ${prices[symbol]:.2f} hit stop/target band"
+            )
+
+        return buys, sells
+
     def update_position(self, symbol: str, quantity: int):
         """
         更新持仓数量
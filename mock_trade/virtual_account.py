@@ -4,22 +4,38 @@ Virtual Account - Mock Trading Account Management
 """
 
 from typing import Dict, List, Optional
+from collections import deque
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
+from itertools import islice
 import json
 import logging
+import time
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+# slots=True: 去掉每实例 __dict__,属性按固定偏移访问
+@dataclass(slots=True)
 class Position:
     """持仓"""
     symbol: str
     quantity: int
     avg_price: float
     current_price: float = 0.0
-    
+    # 成本倒数缓存:除法换乘法,持仓变动时由 _refresh_inv_cost 维护
+    _inv_cost_basis: float = field(init=False, default=0.0, repr=False)
+
+    def __post_init__(self):
+        self._refresh_inv_cost()
+
+    def _refresh_inv_cost(self):
+        """quantity/avg_price 变化后重算成本倒数"""
+        cost = self.quantity * self.avg_price
+        self._inv_cost_basis = 1.0 / cost if cost else 0.0
+
     @property
     def market_value(self) -> float:
         """市值"""
@@ -38,12 +54,11 @@ class Position:
     @property
     def unrealized_pnl_pct(self) -> float:
         """未实现盈亏百分比"""
-        if self.cost_basis == 0:
-            return 0.0
-        return (self.unrealized_pnl / self.cost_basis) * 100
+        # 成本为 0 时倒数缓存为 0,结果同样归零
+        return self.unrealized_pnl * self._inv_cost_basis * 100
 
 
-@dataclass
+@dataclass(slots=True)
 class Trade:
     """交易记录"""
     trade_id: int
@@ -52,7 +67,8 @@ class Trade:
     quantity: int
     price: float
     commission: float
-    timestamp: datetime
+    # epoch 秒的 float,比 datetime 对象便宜得多;仅在导出历史时才格式化
+    timestamp: float = field(default_factory=time.time)
     order_type: str = 'MARKET'  # MARKET, LIMIT, STOP_LOSS, TAKE_PROFIT
     
     @property
@@ -70,15 +86,23 @@ class VirtualAccount:
     
     def __init__(self, initial_capital: float):
         self.initial_capital = initial_capital
+        # 本金倒数只算一次,百分比属性用乘法代替每次除法
+        self._inv_initial = 1.0 / initial_capital
         self.cash = initial_capital
         self.positions: Dict[str, Position] = {}
-        self.trades: List[Trade] = []
+        # 全量交易已由 TradeDatabase 落库,内存里只留最近一段供历史查询,
+        # 有界 deque 防止长会话内存无限增长
+        self.trades: deque = deque(maxlen=10_000)
         self.next_trade_id = 1
         
     @property
     def total_market_value(self) -> float:
         """总市值"""
-        return sum(pos.market_value for pos in self.positions.values())
+        # 直接乘加,绕开每持仓一次的 market_value property 派发与生成器开销
+        total = 0.0
+        for pos in self.positions.values():
+            total += pos.quantity * pos.current_price
+        return total
     
     @property
     def total_equity(self) -> float:
@@ -93,7 +117,7 @@ class VirtualAccount:
     @property
     def total_pnl_pct(self) -> float:
         """总盈亏百分比"""
-        return (self.total_pnl / self.initial_capital) * 100
+        return self.total_pnl * self._inv_initial * 100
     
     def buy(
         self, 
@@ -132,6 +156,7 @@ class VirtualAccount:
             total_cost_basis = (pos.quantity * pos.avg_price) + (quantity * price)
             pos.quantity = total_qty
             pos.avg_price = total_cost_basis / total_qty
+            pos._refresh_inv_cost()
         else:
             self.positions[symbol] = Position(
                 symbol=symbol,
@@ -148,7 +173,6 @@ class VirtualAccount:
             quantity=quantity,
             price=price,
             commission=commission,
-            timestamp=datetime.now(),
             order_type=order_type
         )
         self.trades.append(trade)
@@ -195,6 +219,8 @@ class VirtualAccount:
         pos.quantity -= quantity
         if pos.quantity == 0:
             del self.positions[symbol]
+        else:
+            pos._refresh_inv_cost()
         
         # 记录交易
         trade = Trade(
@@ -204,7 +230,6 @@ class VirtualAccount:
             quantity=quantity,
             price=price,
             commission=commission,
-            timestamp=datetime.now(),
             order_type=order_type
         )
         self.trades.append(trade)
@@ -242,25 +267,55 @@ class VirtualAccount:
         }
     
     def get_positions_list(self) -> List[Dict]:
-        """获取持仓列表"""
+        """获取持仓列表(衍生指标收进 NumPy 数组一次算完,免去逐持仓 property 链)"""
+        positions = list(self.positions.values())
+        if not positions:
+            return []
+
+        qty = np.array([p.quantity for p in positions], dtype=float)
+        avg = np.array([p.avg_price for p in positions], dtype=float)
+        cur = np.array([p.current_price for p in positions], dtype=float)
+
+        market_value = qty * cur
+        cost_basis = qty * avg
+        pnl = market_value - cost_basis
+        pnl_pct = np.divide(pnl, cost_basis,
+                            out=np.zeros_like(pnl), where=cost_basis != 0) * 100
+
+        # tolist() 把 np.float64 还原为内置 float,保证 jsonify 可序列化;
+        # 字段直接铺开构造 dict:asdict 内部走 deepcopy,比字面量慢一个量级
         return [
             {
-                **asdict(pos),
-                'unrealized_pnl': pos.unrealized_pnl,
-                'unrealized_pnl_pct': pos.unrealized_pnl_pct,
-                'market_value': pos.market_value,
-                'cost_basis': pos.cost_basis
+                'symbol': pos.symbol,
+                'quantity': pos.quantity,
+                'avg_price': pos.avg_price,
+                'current_price': pos.current_price,
+                'unrealized_pnl': u_pnl,
+                'unrealized_pnl_pct': u_pct,
+                'market_value': mv,
+                'cost_basis': cb
             }
-            for pos in self.positions.values()
+            for pos, u_pnl, u_pct, mv, cb in zip(
+                positions, pnl.tolist(), pnl_pct.tolist(),
+                market_value.tolist(), cost_basis.tolist()
+            )
         ]
     
     def get_trades_history(self, limit: int = 50) -> List[Dict]:
         """获取交易历史"""
-        recent_trades = self.trades[-limit:]
+        # deque 不支持负切片;从尾部反向取 limit 条再倒回时间正序
+        recent_trades = list(islice(reversed(self.trades), limit))
+        recent_trades.reverse()
         return [
             {
-                **asdict(trade),
-                'timestamp': trade.timestamp.isoformat()
+                'trade_id': trade.trade_id,
+                'symbol': trade.symbol,
+                'action': trade.action,
+                'quantity': trade.quantity,
+                'price': trade.price,
+                'commission': trade.commission,
+                'timestamp': datetime.fromtimestamp(trade.timestamp).isoformat(),
+                'order_type': trade.order_type
             }
             for trade in recent_trades
         ]
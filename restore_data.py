@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+从备份数据库恢复交易计划
+
+与 backup.sh restore 的整库文件覆盖不同，本脚本按行复制数据，
+并自动适配新旧 schema 的列差异（旧备份缺失的列走表默认值），
+可用于从老版本的备份恢复到当前结构的库。
+
+用法:
+    python restore_data.py data/backups/trading_plans_20260112_143000.db
+"""
+
+import sqlite3
+import sys
+
+
+def restore_and_migrate(backup_path: str, db_path: str = 'data/trading_plans.db') -> int:
+    """
+    从备份库恢复 trading_plans 表到目标库
+
+    Args:
+        backup_path: 备份数据库文件路径
+        db_path: 目标数据库文件路径
+
+    Returns:
+        恢复的记录数
+    """
+    # 目标库先用当前代码初始化，保证建表/迁移/索引齐全
+    from database import TradingPlanDB
+    TradingPlanDB(db_path).close()
+
+    new_conn = sqlite3.connect(db_path)
+    try:
+        # 一次性导入不需要崩溃安全：关掉 fsync 与磁盘日志，临时数据走内存
+        new_conn.execute('PRAGMA journal_mode=MEMORY')
+        new_conn.execute('PRAGMA synchronous=OFF')
+        new_conn.execute('PRAGMA temp_store=MEMORY')
+
+        # 备份库挂载为附属库后用 INSERT...SELECT 引擎内复制，
+        # 数据不经过 Python，零行级往返、零 dict 构造
+        new_conn.execute('ATTACH DATABASE ? AS old', (backup_path,))
+
+        # 只复制两边都有的列，旧备份没有的新列由表默认值补齐
+        old_columns = [
+            row[1] for row in new_conn.execute('PRAGMA old.table_info(trading_plans)')
+        ]
+        new_columns = {
+            row[1] for row in new_conn.execute('PRAGMA table_info(trading_plans)')
+        }
+        column_list = ', '.join(c for c in old_columns if c in new_columns)
+
+        new_conn.execute('BEGIN')
+        new_conn.execute('DELETE FROM trading_plans')
+        cursor = new_conn.execute(f'''
+            INSERT INTO trading_plans ({column_list})
+            SELECT {column_list} FROM old.trading_plans
+        ''')
+        count = cursor.rowcount
+        new_conn.commit()
+
+        # 批量灌入后刷新统计信息,让查询计划器知道真实的数据分布
+        new_conn.execute('ANALYZE trading_plans')
+        return count
+    finally:
+        new_conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    count = restore_and_migrate(sys.argv[1], *sys.argv[2:3])
+    print(f'✓ 已恢复 {count} 条交易计划')